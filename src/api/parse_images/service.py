@@ -4,6 +4,7 @@ from typing import Optional
 from pydantic import BaseModel, Field
 
 from src.api.parse_images.schemas import ParsingResultSchema
+from src.api.search.embeddings import EmbeddingService
 from src.api.search.service import ElasticService
 from src.config import settings
 from src.database.cii_db.queries import TransactionSessionQuery
@@ -67,7 +68,7 @@ class ParseService(BaseParseService):
             tags_image = await cls.get_tags(soup=soup)
 
             # Сохранение данных в базе
-            id_img = await TransactionSessionQuery.insert_new_picture(
+            id_img, tag_ids = await TransactionSessionQuery.insert_new_picture(
                 info_picture=PicturesCreateSchema(
                     resolution_width=image_info.width,
                     resolution_height=image_info.height,
@@ -81,8 +82,13 @@ class ParseService(BaseParseService):
             await ElasticService.add_data(
                 index_name=settings.ELASTIC_INDEX,
                 id_image=id_img,
-                tags_image=tags_image
+                tags_image=tags_image,
+                tag_ids=tag_ids,
+                # Сброс кэша выдачи после add_data не должен опережать refresh индекса
+                refresh="wait_for"
             )
+            # Эмбеддинг для поиска похожих изображений
+            await EmbeddingService.add_picture(picture_id=id_img, image_data=image_info.img_data)
 
 
         except Exception as e:
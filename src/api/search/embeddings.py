@@ -0,0 +1,92 @@
+import asyncio
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from src.api.tags_model.service import TagsService
+from src.config import settings
+from src.utils.embedding_store import EmbeddingStore
+from src.utils.singleton_meta import SingletonMeta
+
+__all__ = ['EmbeddingService']
+
+
+class EmbeddingService(metaclass=SingletonMeta):
+    """Эмбеддинги CLIP изображений коллекции и поиск похожих изображений.
+
+    Эмбеддинги изображений и текстовых запросов берутся из одного чекпоинта CLIP_EMBEDDING_MODEL
+    (TagsService.embed_image / embed_text), хранилище помечено его именем."""
+    store: Optional[EmbeddingStore] = None
+
+    @classmethod
+    def get_store(cls) -> EmbeddingStore:
+        if cls.store is None:
+            cls.store = EmbeddingStore(
+                settings.EMBEDDINGS_PATH,
+                ivf_min_size=settings.EMBEDDINGS_IVF_MIN_SIZE,
+                nprobe=settings.EMBEDDINGS_IVF_NPROBE,
+                model=settings.CLIP_EMBEDDING_MODEL
+            )
+        return cls.store
+
+    @classmethod
+    async def add_picture(cls, picture_id: int, image_data: bytes):
+        """Вычисляет и сохраняет эмбеддинг нового изображения."""
+        embedding = await TagsService.embed_image(image_data)
+        await asyncio.to_thread(cls.get_store().add, [picture_id], embedding[np.newaxis])
+
+    @classmethod
+    async def get_picture_embedding(cls, picture_id: int) -> Optional[np.ndarray]:
+        return await asyncio.to_thread(cls.get_store().get, picture_id)
+
+    @classmethod
+    async def search(cls, embedding: np.ndarray, limit: int, exclude: List[int] = ()) -> Tuple[List[int], List[float]]:
+        """Идентификаторы изображений, ближайших к эмбеддингу, и их косинусная близость."""
+        ids, scores = await asyncio.to_thread(cls.get_store().search, embedding, limit, exclude)
+        return ids.tolist(), scores.tolist()
+
+    @classmethod
+    async def search_similar(cls, limit: int, image_data: Optional[bytes] = None,
+                             picture_id: Optional[int] = None) -> Optional[Tuple[List[int], List[float]]]:
+        """Поиск по загруженному изображению или по изображению коллекции (оно исключается из выдачи).
+        Возвращает None, если для picture_id нет эмбеддинга."""
+        if picture_id is not None:
+            embedding = await cls.get_picture_embedding(picture_id)
+            if embedding is None:
+                return None
+            return await cls.search(embedding, limit, exclude=[picture_id])
+        return await cls.search(await TagsService.embed_image(image_data), limit)
+
+    @classmethod
+    async def search_text(cls, text: str, limit: int) -> Tuple[List[int], List[float]]:
+        """Поиск изображений по тексту: эмбеддинг запроса текстовой частью того же чекпоинта CLIP,
+        что и эмбеддинги изображений, и косинусная близость с их матрицей."""
+        embedding = (await TagsService.embed_text([text]))[0]
+        return await cls.search(embedding, limit)
+
+    @classmethod
+    async def search_hybrid(cls, text: str, keyword_results: List[Tuple[int, float]], limit: int,
+                            weight: float) -> Tuple[List[int], List[float]]:
+        """Слияние поиска CLIP с результатами Elasticsearch: weight * cos + (1 - weight) * score / max(score).
+        Для изображений из выдачи Elasticsearch близость считается по их эмбеддингам."""
+        embedding = (await TagsService.embed_text([text]))[0]
+        clip_ids, clip_scores = await cls.search(embedding, limit)
+
+        keyword_ids = [picture_id for picture_id, _ in keyword_results]
+        keyword_scores = np.asarray([score for _, score in keyword_results], dtype=np.float32)
+        if keyword_scores.size:
+            keyword_scores /= max(float(keyword_scores.max()), 1e-12)
+        keyword_cosine = await asyncio.to_thread(cls.get_store().scores_for_ids, embedding, keyword_ids)
+
+        cosine = dict(zip(clip_ids, clip_scores))
+        cosine.update({
+            picture_id: float(score) for picture_id, score in zip(keyword_ids, keyword_cosine) if not np.isnan(score)
+        })
+        keyword = dict(zip(keyword_ids, keyword_scores.tolist()))
+
+        fused = {
+            picture_id: weight * cosine.get(picture_id, 0.0) + (1 - weight) * keyword.get(picture_id, 0.0)
+            for picture_id in cosine.keys() | keyword.keys()
+        }
+        ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [picture_id for picture_id, _ in ranked], [score for _, score in ranked]
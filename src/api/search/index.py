@@ -0,0 +1,93 @@
+from typing import List
+
+__all__ = ['TAGS_INDEX_SETTINGS', 'TAGS_INDEX_MAPPINGS', 'exact_tags_query', 'fuzzy_tags_query']
+
+# Индекс тегов изображений. Нормализатор приводит тег к нижнему регистру и заменяет подчеркивания
+# пробелами ("Long_Hair" и "long hair" - один и тот же термин), edge n-gram анализатор - для частичных совпадений
+TAGS_INDEX_SETTINGS = {
+    "analysis": {
+        "char_filter": {
+            "tag_underscores": {
+                "type": "mapping",
+                "mappings": ["_ => \\u0020", "- => \\u0020"]
+            }
+        },
+        "normalizer": {
+            "tag_normalizer": {
+                "type": "custom",
+                "char_filter": ["tag_underscores"],
+                "filter": ["lowercase", "asciifolding"]
+            }
+        },
+        "tokenizer": {
+            "tag_edge_ngram": {
+                "type": "edge_ngram",
+                "min_gram": 2,
+                "max_gram": 15,
+                "token_chars": ["letter", "digit"]
+            }
+        },
+        "analyzer": {
+            "tag_prefix": {
+                "type": "custom",
+                "char_filter": ["tag_underscores"],
+                "tokenizer": "tag_edge_ngram",
+                "filter": ["lowercase", "asciifolding"]
+            },
+            "tag_words": {
+                "type": "custom",
+                "char_filter": ["tag_underscores"],
+                "tokenizer": "standard",
+                "filter": ["lowercase", "asciifolding"]
+            }
+        }
+    }
+}
+
+TAGS_INDEX_MAPPINGS = {
+    "dynamic": "strict",
+    "properties": {
+        "postgresql_id": {"type": "long"},
+        "tag_ids": {"type": "integer"},
+        "tags": {
+            "type": "text",
+            "analyzer": "tag_words",
+            "fields": {
+                "keyword": {"type": "keyword", "normalizer": "tag_normalizer", "ignore_above": 256},
+                "prefix": {"type": "text", "analyzer": "tag_prefix", "search_analyzer": "tag_words"}
+            }
+        }
+    }
+}
+
+
+def exact_tags_query(tags: List[str]) -> dict:
+    """Совпадение нормализованных тегов целиком: один term на тег, score растет с числом совпавших тегов."""
+    return {
+        "bool": {
+            "should": [{"term": {"tags.keyword": tag}} for tag in tags],
+            "minimum_should_match": 1
+        }
+    }
+
+
+def fuzzy_tags_query(tags: List[str]) -> dict:
+    """Неточные совпадения слов тегов (fuzziness AUTO) и совпадения по началу слов (edge n-gram)."""
+    text = " ".join(tags)
+    return {
+        "bool": {
+            "should": [
+                {
+                    "match": {
+                        "tags": {
+                            "query": text,
+                            "operator": "or",
+                            "fuzziness": "AUTO"  # Позволяет учитывать неточные совпадения и падежи
+                        }
+                    }
+                },
+                {"match": {"tags.prefix": {"query": text, "operator": "or"}}}
+            ],
+            "minimum_should_match": 1
+        }
+    }
@@ -0,0 +1,146 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Set
+
+from src.api.search.schemas import SearchPage
+from src.config import settings
+from src.logger import logger
+from src.utils.elastic_service import BaseElasticService
+from src.utils.singleton_meta import SingletonMeta
+from src.utils.ttl_cache import TTLCache
+
+__all__ = ['SearchResultService']
+
+
+class SearchResultService(metaclass=SingletonMeta):
+    """Кэш страниц выдачи поиска (id изображений и total) по (нормализованный запрос, режим, page, page_size).
+
+    Запись новых данных увеличивает поколение кэша и очищает его; записи прошлых поколений не возвращаются.
+    - Записи этого воркера (ElasticService.add_data с refresh=wait_for, TransactionSessionQuery.insert_new_picture)
+      сбрасывают кэш через SEARCH_RESULT_INVALIDATE_DELAY_SECONDS; все записи за это время дают один сброс.
+    - Записи других воркеров и скрипта парсинга определяются по счетчикам индексации ELASTIC_INDEX, которые
+      проверяются не чаще раза в SEARCH_RESULT_GENERATION_POLL_SECONDS. После изменения счетчиков кэш
+      сбрасывается еще раз при следующей проверке: новые документы видны поиску только после refresh индекса.
+    Одновременные одинаковые запросы ожидают один и тот же поиск."""
+    cache: Optional[TTLCache] = None
+    generation: int = 0
+    last_write_at: Optional[float] = None
+    _inflight: Dict[Hashable, asyncio.Future] = {}
+    # Изображения, записанные после последнего сброса, и отложенный сброс
+    _pending_pictures: Set[Optional[int]] = set()
+    _flush_handle: Optional[asyncio.TimerHandle] = None
+    # Счетчики индексации ELASTIC_INDEX при последней проверке: общее для всех процессов состояние
+    _index_writes: Optional[tuple] = None
+    _index_checked_at: float = 0.0
+    _index_recheck: bool = False
+    counters = {"coalesced": 0, "invalidations": 0, "invalidated_pictures": 0, "index_invalidations": 0,
+                "served_age_total": 0.0, "served_age_max": 0.0}
+
+    @classmethod
+    def get_cache(cls) -> TTLCache:
+        if cls.cache is None:
+            cls.cache = TTLCache(maxsize=settings.SEARCH_RESULT_CACHE_SIZE, ttl=settings.SEARCH_RESULT_CACHE_TTL_SECONDS)
+        return cls.cache
+
+    @classmethod
+    async def invalidate(cls, picture_id: Optional[int] = None):
+        """Отложенный сброс кэша после записи данных (подписчик новых изображений TransactionSessionQuery)."""
+        cls.last_write_at = time.time()
+        cls._pending_pictures.add(picture_id)
+        if cls._flush_handle is None:
+            cls._flush_handle = asyncio.get_running_loop().call_later(
+                settings.SEARCH_RESULT_INVALIDATE_DELAY_SECONDS, cls._flush
+            )
+
+    @classmethod
+    def _flush(cls):
+        cls._flush_handle = None
+        cls.counters["invalidated_pictures"] += len(cls._pending_pictures)
+        cls._pending_pictures.clear()
+        cls._next_generation()
+
+    @classmethod
+    def _next_generation(cls):
+        cls.generation += 1
+        cls.counters["invalidations"] += 1
+        cls.get_cache().clear()
+
+    @classmethod
+    async def _sync_index_generation(cls):
+        """Сброс кэша после записей других процессов: сравнение счетчиков индексации и удаления документов."""
+        now = time.monotonic()
+        if now - cls._index_checked_at < settings.SEARCH_RESULT_GENERATION_POLL_SECONDS:
+            return
+        cls._index_checked_at = now
+        try:
+            stats = await BaseElasticService.get_client().indices.stats(
+                index=settings.ELASTIC_INDEX, metric="indexing",
+                filter_path="_all.primaries.indexing.index_total,_all.primaries.indexing.delete_total"
+            )
+            indexing = stats["_all"]["primaries"]["indexing"]
+            index_writes = (indexing["index_total"], indexing["delete_total"])
+        except Exception as e:
+            logger.warning(f"Не удалось получить счетчики индексации для кэша выдачи: {e}")
+            return
+
+        changed = cls._index_writes is not None and index_writes != cls._index_writes
+        if changed or cls._index_recheck:
+            cls.counters["index_invalidations"] += 1
+            cls._next_generation()
+        cls._index_writes, cls._index_recheck = index_writes, changed
+
+    @classmethod
+    async def get_or_search(cls, key: Hashable, search: Callable[[], Awaitable[SearchPage]]) -> SearchPage:
+        await cls._sync_index_generation()
+        cache = cls.get_cache()
+        cached = cache.get(key)
+        if cached is not None and cached[0] == cls.generation:
+            age = time.time() - cached[1]
+            cls.counters["served_age_total"] += age
+            cls.counters["served_age_max"] = max(cls.counters["served_age_max"], age)
+            return cached[2]
+
+        future = cls._inflight.get(key)
+        if future is not None:
+            cls.counters["coalesced"] += 1
+            return await asyncio.shield(future)
+
+        generation, created_at = cls.generation, time.time()
+        future = asyncio.ensure_future(search())
+        cls._inflight[key] = future
+        try:
+            found = await asyncio.shield(future)
+        finally:
+            cls._inflight.pop(key, None)
+
+        # Результат, полученный во время записи, может не содержать новых данных - он не кэшируется.
+        # Страницы с курсором point-in-time не кэшируются: курсор действителен ограниченное время
+        if generation == cls.generation and found.next_cursor is None:
+            cache.set(key, (generation, created_at, found))
+        return found
+
+    @classmethod
+    def stats(cls) -> dict:
+        stats = cls.get_cache().stats()
+        return {
+            **stats,
+            "generation": cls.generation,
+            "coalesced": cls.counters["coalesced"],
+            "invalidations": cls.counters["invalidations"],
+            "invalidated_pictures": cls.counters["invalidated_pictures"],
+            "index_invalidations": cls.counters["index_invalidations"],
+            "seconds_since_last_write": (round(time.time() - cls.last_write_at, 1)
+                                         if cls.last_write_at is not None else None),
+            # Возраст отданных из кэша результатов: насколько выдача могла отстать от данных других процессов
+            "served_age_avg_seconds": (round(cls.counters["served_age_total"] / stats["hits"], 2)
+                                       if stats["hits"] else 0.0),
+            "served_age_max_seconds": round(cls.counters["served_age_max"], 2),
+        }
+
+    @classmethod
+    def close_service(cls):
+        if cls._flush_handle is not None:
+            cls._flush_handle.cancel()
+            cls._flush_handle = None
+        cls.cache = None
+        cls._inflight.clear()
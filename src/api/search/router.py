@@ -1,14 +1,68 @@
-from fastapi import APIRouter, HTTPException, Query
+from typing import Literal, Optional
+
+from fastapi import APIRouter, File, HTTPException, Query, UploadFile
 from fastapi_versioning import version
 
-from src.api.search.schemas import ResponsePictures
-from src.api.search.service import ElasticService
+from src.api.search.embeddings import EmbeddingService
+from src.api.search.result_cache import SearchResultService
+from src.api.search.schemas import (ResponsePictures, ResponseSimilarPictures,
+                                    ResponseTagSuggestions, SearchPage,
+                                    TagSuggestionSchema)
+from src.api.search.service import ElasticService, PicturesTotalService
+from src.api.search.suggest import TagSuggestService
 from src.database.cii_db.queries import PicturesQuery
 from src.logger import logger
 from src.config import settings
 
 router = APIRouter(tags=["Search images"], prefix="/search")
 
+SearchMode = Literal["keywords", "clip", "hybrid"]
+
+
+async def search_page(search_string: str, mode: SearchMode, page: int, page_size: int,
+                      cursor: Optional[str] = None) -> SearchPage:
+    """Страница идентификаторов изображений по убыванию релевантности для выбранного режима поиска."""
+    if mode == "keywords":
+        return await ElasticService.search_page(
+            search_string=search_string, index_name=settings.ELASTIC_INDEX,
+            page=page, page_size=page_size, cursor=cursor
+        )
+    if mode == "clip":
+        ids, _ = await EmbeddingService.search_text(search_string, limit=settings.SEARCH_CLIP_TOP_K)
+    else:
+        keyword_results = await ElasticService.search_scored(
+            search_string=search_string, index_name=settings.ELASTIC_INDEX, size=settings.SEARCH_CLIP_TOP_K
+        )
+        ids, _ = await EmbeddingService.search_hybrid(
+            search_string, keyword_results, limit=settings.SEARCH_CLIP_TOP_K, weight=settings.SEARCH_FUSION_WEIGHT
+        )
+    start = page_size * (page - 1)
+    return SearchPage(ids=ids[start:start + page_size], total=len(ids))
+
+
+@router.get("/stats")
+@version(1)
+async def get_search_stats():
+    """Метрики поиска: попадания/промахи кэша ключевых слов запросов, кэша выдачи и т.п."""
+    return {**ElasticService.stats(), "results_cache": SearchResultService.stats()}
+
+
+@router.get("/tags/suggest", response_model=ResponseTagSuggestions)
+@version(1)
+async def suggest_tags(
+        q: str = Query(description="Начало названия тега или любого его слова", min_length=1),
+        limit: int = Query(default=10, description="Количество подсказок", ge=1, le=50),
+):
+    """Подсказки тегов по префиксу, по убыванию количества изображений."""
+    try:
+        suggestions = await TagSuggestService.suggest(q, limit)
+    except Exception as e:
+        logger.exception(f"Ошибка при получении подсказок тегов: {e}")
+        raise HTTPException(status_code=500, detail="Ошибка при получении подсказок тегов")
+    return ResponseTagSuggestions(data=[
+        TagSuggestionSchema(id=tag_id, name=name, pictures=count) for tag_id, name, count in suggestions
+    ])
+
 
 @router.get("", response_model=ResponsePictures)
 @version(1)
@@ -16,30 +70,98 @@ async def start_search(
         search_string: str = None,
         page: int = Query(default=1, description="Начальная страница", ge=1),
         page_size: int = Query(default=10, description="Количество элементов на странице", ge=1, le=100),
+        mode: Optional[SearchMode] = Query(
+            default=None, description="keywords - KeyBERT + Elasticsearch, clip - текстовые эмбеддинги CLIP, "
+                                      "hybrid - слияние обоих (по умолчанию SEARCH_MODE)"
+        ),
+        cursor: Optional[str] = Query(
+            default=None, description="Режим keywords: \"*\" - начать листание по курсору, иначе next_cursor "
+                                      "предыдущего ответа (page при этом не учитывается)"
+        ),
 ):
     """Запускает поиск подходящий изображений."""
 
     try:
-        result_ids = None
         if search_string and search_string.strip():
             search_string = " ".join(search_string.split())
-            result_ids = await ElasticService.search(
-                search_string=search_string, limit=page_size,
-                index_name=settings.ELASTIC_INDEX
+            mode = mode or settings.SEARCH_MODE
+            if cursor is None:
+                found = await SearchResultService.get_or_search(
+                    (ElasticService.normalize_query(search_string), mode, page, page_size),
+                    lambda: search_page(search_string, mode, page, page_size)
+                )
+            else:
+                found = await search_page(search_string, mode, page, page_size, cursor)
+            if not found.ids:
+                return ResponsePictures(data=[], total=found.total, total_exact=found.total_exact)
+
+            # Страница уже выбрана поиском, порядок сохраняется через image_ids
+            results = await PicturesQuery.get_pictures_with_tags_by_ids(
+                limit=len(found.ids),
+                offset=0,
+                image_ids=found.ids
             )
+            return ResponsePictures(data=results, total=found.total, total_exact=found.total_exact,
+                                    next_cursor=found.next_cursor)
 
         results = await PicturesQuery.get_pictures_with_tags_by_ids(
             limit=page_size,
             offset=page_size * (page - 1),
-            image_ids=result_ids
-        )
-        total = await PicturesQuery.get_total_by_filter(
-            image_ids=result_ids
         )
+        total = await PicturesTotalService.get()
 
-        return ResponsePictures(data=results, total=total)
-
+        return ResponsePictures(data=results, total=total, total_exact=False)
 
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.exception(f"Ошибка при поиске: {e}")
         raise HTTPException(status_code=500, detail="Ошибка при поиске")
+
+
+@router.post("/similar", response_model=ResponseSimilarPictures)
+@version(1)
+async def search_similar(
+        file: Optional[UploadFile] = File(default=None),
+        picture_id: Optional[int] = Query(default=None, description="Идентификатор изображения коллекции"),
+        page: int = Query(default=1, description="Начальная страница", ge=1),
+        page_size: int = Query(default=10, description="Количество элементов на странице", ge=1, le=100),
+):
+    """Поиск похожих изображений по эмбеддингам CLIP: по загруженному файлу или по picture_id."""
+    if (file is None) == (picture_id is None):
+        raise HTTPException(status_code=400, detail="Укажите либо файл изображения, либо picture_id.")
+    if file is not None and file.content_type not in ["image/jpeg", "image/png"]:
+        raise HTTPException(status_code=400, detail="Только JPEG и PNG изображения поддерживаются.")
+
+    try:
+        image_data = await file.read() if file is not None else None
+        found = await EmbeddingService.search_similar(
+            limit=page_size * page, image_data=image_data, picture_id=picture_id
+        )
+    except Exception as e:
+        logger.exception(f"Ошибка при поиске похожих изображений: {e}")
+        raise HTTPException(status_code=500, detail="Ошибка при поиске")
+    if found is None:
+        raise HTTPException(status_code=404, detail="Эмбеддинг изображения не найден.")
+
+    ids, scores = found
+    # Выдача ограничена найденными соседями, а не размером коллекции
+    total = len(ids)
+    start = page_size * (page - 1)
+    ids, scores = ids[start:], scores[start:]
+    if not ids:
+        return ResponseSimilarPictures(data=[], total=total, scores=[])
+
+    try:
+        # Страница уже выбрана по близости, порядок сохраняется через image_ids
+        results = await PicturesQuery.get_pictures_with_tags_by_ids(limit=len(ids), offset=0, image_ids=ids)
+    except Exception as e:
+        logger.exception(f"Ошибка при поиске похожих изображений: {e}")
+        raise HTTPException(status_code=500, detail="Ошибка при поиске")
+
+    score_by_id = dict(zip(ids, scores))
+    return ResponseSimilarPictures(
+        data=results,
+        total=total,
+        scores=[score_by_id[row["id"]] for row in results]
+    )
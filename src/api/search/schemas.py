@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
 
 
@@ -23,3 +23,31 @@ class PicturesWithTagsSchema(BaseModel):
 class ResponsePictures(BaseModel):
     data: List[PicturesWithTagsSchema]
     total: int
+    # false - total является оценкой или нижней границей (ELASTIC_TRACK_TOTAL_HITS, статистика PostgreSQL)
+    total_exact: bool = True
+    # Курсор следующей страницы (глубокая пагинация через point-in-time Elasticsearch)
+    next_cursor: Optional[str] = None
+
+
+class SearchPage(BaseModel):
+    """Одна страница выдачи поиска: идентификаторы изображений по убыванию релевантности."""
+    ids: List[int]
+    total: int
+    total_exact: bool = True
+    next_cursor: Optional[str] = None
+
+
+class ResponseSimilarPictures(ResponsePictures):
+    # Косинусная близость к запросу для каждого элемента data
+    scores: List[float]
+
+
+class TagSuggestionSchema(BaseModel):
+    id: int
+    name: str
+    # Количество изображений с тегом
+    pictures: int
+
+
+class ResponseTagSuggestions(BaseModel):
+    data: List[TagSuggestionSchema]
@@ -1,7 +1,23 @@
-from typing import List
+import asyncio
+import base64
+import json
+from typing import List, Optional, Tuple, Union
 
+from src.api.search.index import (TAGS_INDEX_MAPPINGS, TAGS_INDEX_SETTINGS,
+                                  exact_tags_query, fuzzy_tags_query)
+from src.api.search.result_cache import SearchResultService
+from src.api.search.schemas import SearchPage
+from src.config import settings
+from src.database.cii_db.queries import PicturesQuery, TagsQuery
+from src.inference_server.client import RemoteKeywordModel
+from src.logger import logger
+from src.utils.background import BackoffRefresh, SharedLoad
 from src.utils.elastic_service import BaseElasticService
-from elasticsearch import Elasticsearch, helpers
+from src.utils.singleton_meta import SingletonMeta
+from src.utils.ttl_cache import TTLCache
+from src.utils.vocabulary_matcher import VocabularyMatcher
+from elasticsearch import NotFoundError
+from elasticsearch.helpers import async_bulk
 from keybert import KeyBERT
 from flair.embeddings import TransformerDocumentEmbeddings
 import warnings
@@ -9,50 +25,199 @@ from elasticsearch import ElasticsearchWarning
 
 warnings.filterwarnings("ignore", category=ElasticsearchWarning)
 
+# Ответ поиска урезается до полей, нужных для выдачи: id в PostgreSQL, score, значения сортировки и total
+_PAGE_FILTER_PATH = "pit_id,hits.total,hits.hits._score,hits.hits.sort,hits.hits._source.postgresql_id"
+
+
+def create_keyword_model(model_name: str) -> KeyBERT:
+    """KeyBERT поверх эмбеддингов трансформера, прогретый первым вызовом (токенизатор и веса)."""
+    kw_model = KeyBERT(model=TransformerDocumentEmbeddings(model_name))
+    kw_model.extract_keywords("warmup", keyphrase_ngram_range=(1, 2), top_n=1)
+    return kw_model
+
 
 class ElasticService(BaseElasticService):
-    roberta = TransformerDocumentEmbeddings('roberta-base')
-    kw_model = KeyBERT(model=roberta)
+    kw_model: Optional[Union[KeyBERT, RemoteKeywordModel]] = None
+    _init_load = SharedLoad()
+
+    # Кэш ключевых слов по нормализованной строке запроса (LRU + TTL, опционально sqlite)
+    keywords_cache: Optional[TTLCache] = None
+
+    # Словарь известных тегов для разбора запроса без KeyBERT (загружается из TagsModel при первом запросе)
+    vocabulary: Optional[VocabularyMatcher] = None
+    _vocabulary_load = SharedLoad()
+    _vocabulary_refresh = BackoffRefresh(settings.SEARCH_VOCABULARY_REFRESH_SECONDS, "Query vocabulary")
+    # Сколько запросов разобрано каждым способом
+    parser_stats = {"vocabulary": 0, "keybert": 0, "keybert_cached": 0}
 
     @classmethod
-    async def search(cls, search_string: str, index_name: str, limit: int = 10):
+    def get_keywords_cache(cls) -> TTLCache:
+        if cls.keywords_cache is None:
+            cls.keywords_cache = TTLCache(
+                maxsize=settings.SEARCH_KEYWORDS_CACHE_SIZE,
+                ttl=settings.SEARCH_KEYWORDS_CACHE_TTL_SECONDS,
+                disk_path=settings.SEARCH_KEYWORDS_CACHE_DISK_PATH
+            )
+        return cls.keywords_cache
+
+    @classmethod
+    def close_service(cls):
+        if cls.keywords_cache is not None:
+            cls.keywords_cache.close()
+            cls.keywords_cache = None
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {
+            "keywords_cache": cls.get_keywords_cache().stats(),
+            "query_parser": {
+                "mode": settings.SEARCH_QUERY_PARSER,
+                "vocabulary_size": len(cls.vocabulary) if cls.vocabulary is not None else None,
+                **cls.parser_stats,
+            },
+        }
+
+    @classmethod
+    async def get_vocabulary(cls) -> VocabularyMatcher:
+        """Автомат по названиям всех тегов; параллельные вызовы ожидают одну загрузку.
+        Теги, добавленные другими воркерами и скриптом парсинга, дочитываются из базы в фоне
+        раз в SEARCH_VOCABULARY_REFRESH_SECONDS."""
+        if cls.vocabulary is not None:
+            cls._vocabulary_refresh.schedule(cls._refresh_vocabulary)
+            return cls.vocabulary
+        return await cls._vocabulary_load.run(cls._load_vocabulary)
+
+    @classmethod
+    async def _load_vocabulary(cls) -> VocabularyMatcher:
+        tags = await TagsQuery.find_all()
+        cls.vocabulary = await asyncio.to_thread(VocabularyMatcher, [tag["name"] for tag in tags])
+        cls._vocabulary_refresh.touch()
+        return cls.vocabulary
+
+    @classmethod
+    async def _refresh_vocabulary(cls):
+        tags = await TagsQuery.find_all()
+        # Уже известные теги пропускаются внутри add
+        await asyncio.to_thread(cls.vocabulary.add, [tag["name"] for tag in tags])
+
+    @classmethod
+    async def add_vocabulary_tags(cls, tags: List[Tuple[int, str]]):
+        """Новые теги сразу попадают в словарь (подписчик новых тегов TransactionSessionQuery).
+        До первой загрузки словаря ничего не делает: теги будут прочитаны из базы вместе с остальными."""
+        if cls.vocabulary is not None:
+            cls.vocabulary.add(name for _, name in tags)
 
-        keyword = cls.kw_model.extract_keywords(search_string, keyphrase_ngram_range=(1, 2), top_n=10)
+    @staticmethod
+    def normalize_query(search_string: str) -> str:
+        return " ".join(search_string.lower().split())
+
+    @classmethod
+    async def extract_tags(cls, search_string: str) -> List[str]:
+        """Теги запроса. В режиме vocabulary сначала ищутся известные теги из словаря, KeyBERT запускается
+        только если ни один тег не найден. Ключевые слова KeyBERT кэшируются по нормализованной строке,
+        поэтому следующие страницы выдачи не запускают языковую модель повторно."""
+        query = cls.normalize_query(search_string)
+        if settings.SEARCH_QUERY_PARSER == "vocabulary":
+            vocabulary = await cls.get_vocabulary()
+            tags = vocabulary.match(query)
+            if tags:
+                cls.parser_stats["vocabulary"] += 1
+                return tags
+
+        cache = cls.get_keywords_cache()
+        tags = await cache.aget(query)
+        if tags is not None:
+            cls.parser_stats["keybert_cached"] += 1
+            return tags
+
+        if cls.kw_model is None:
+            await cls.init_service()
+        keyword = await asyncio.to_thread(
+            cls.kw_model.extract_keywords, query, keyphrase_ngram_range=(1, 2), top_n=10
+        )
         tags = []
 
         for group in keyword:
             tags.append(group[0])
 
+        cls.parser_stats["keybert"] += 1
+        await cache.aset(query, tags)
+        return tags
+
+    @classmethod
+    async def init_service(cls):
+        """Загрузка модели KeyBERT в отдельном потоке (не при импорте модуля).
+        Параллельные вызовы ожидают одну и ту же загрузку."""
+        if cls.kw_model is not None:
+            return
+        await cls._init_load.run(lambda: asyncio.to_thread(cls._load_kw_model))
+
+    @classmethod
+    def _load_kw_model(cls):
+        if settings.INFERENCE_SERVER_SOCKET:
+            # Модель загружена в процессе инференса, общем для всех воркеров
+            cls.kw_model = RemoteKeywordModel(settings.INFERENCE_SERVER_SOCKET,
+                                              timeout=settings.INFERENCE_SERVER_TIMEOUT)
+        else:
+            cls.kw_model = create_keyword_model(settings.KEYBERT_MODEL)
+        print("ElasticService KeyBERT model initialized successfully.")
+
+    @classmethod
+    async def search(cls, search_string: str, index_name: str, limit: int = 10):
+        return [picture_id for picture_id, _ in await cls.search_scored(search_string, index_name, size=limit)]
+
+    @classmethod
+    async def ensure_index(cls, index_name: str):
+        """Создает индекс с явной схемой (TAGS_INDEX_MAPPINGS), если его еще нет.
+        Индекс, созданный ранее динамической схемой, не изменяется: для нормализатора и анализатора
+        частичных совпадений его нужно переиндексировать."""
+        try:
+            if await cls._client.indices.exists(index=index_name):
+                mapping = await cls._client.indices.get_mapping(index=index_name)
+                properties = mapping[index_name]["mappings"].get("properties", {})
+                if "tag_ids" not in properties:
+                    logger.warning("Elasticsearch index was created with dynamic mapping, reindex it to use "
+                                   "normalized tags", extra={"index": index_name})
+                return
+            await cls._client.indices.create(index=index_name, settings=TAGS_INDEX_SETTINGS,
+                                             mappings=TAGS_INDEX_MAPPINGS)
+            logger.info("Elasticsearch index created", extra={"index": index_name})
+        except Exception as e:
+            logger.error("Cannot bootstrap Elasticsearch index", extra={"index": index_name, "error": e},
+                         exc_info=True)
+
+    @staticmethod
+    def build_query(tags: List[str], fuzzy: bool) -> dict:
+        return fuzzy_tags_query(tags) if fuzzy else exact_tags_query(tags)
+
+    @classmethod
+    async def search_scored(cls, search_string: str, index_name: str,
+                            size: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Поиск по ключевым словам запроса: (id изображения в PostgreSQL, score Elasticsearch)."""
+        tags = await cls.extract_tags(search_string)
+
         query = {
-            "query": {
-                "bool": {
-                    "must": [
-                        {
-                            "match": {
-                                "tags": {
-                                    "query": " ".join(tags),
-                                    "operator": "or",
-                                    "fuzziness": "AUTO"  # Позволяет учитывать неточные совпадения и падежи
-                                }
-                            }
-                        }
-                    ]
-                }
-            },
+            "query": cls.build_query(tags, fuzzy=settings.SEARCH_TAGS_MATCH == "fuzzy"),
             "sort": [
                 {"_score": {"order": "desc"}}  # Ранжирование по релевантности
             ],
-            #"size": limit  # Установка лимита на количество записей
+            "_source": ["postgresql_id"],
         }
+        if size is not None:
+            query["size"] = size
 
         try:
             # Выполняем поиск
-            response = cls._client.search(index=index_name, body=query)
+            response = await cls._client.search(index=index_name, body=query, filter_path=_PAGE_FILTER_PATH)
+            if settings.SEARCH_TAGS_MATCH == "exact" and not response.get("hits", {}).get("hits"):
+                # Точных совпадений нет - неточный поиск
+                query["query"] = cls.build_query(tags, fuzzy=True)
+                response = await cls._client.search(index=index_name, body=query, filter_path=_PAGE_FILTER_PATH)
 
-            # Извлекаем id элементов из PostgreSQL из результатов поиска
+            # Извлекаем id элементов из PostgreSQL и релевантность из результатов поиска
             results = [
-                hit["_source"]["postgresql_id"]
-                for hit in response["hits"]["hits"]
+                (hit["_source"]["postgresql_id"], hit["_score"])
+                for hit in response.get("hits", {}).get("hits", [])
             ]
 
             return results
@@ -61,23 +226,152 @@ class ElasticService(BaseElasticService):
             print(f"Ошибка при выполнении поиска: {e}")
             return []
 
+    @staticmethod
+    def encode_cursor(pit_id: str, search_after: list, fuzzy: bool) -> str:
+        data = json.dumps({"pit": pit_id, "after": search_after, "fuzzy": fuzzy}).encode()
+        return base64.urlsafe_b64encode(data).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[str, list, bool]:
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return data["pit"], data["after"], data["fuzzy"]
+        except (ValueError, KeyError, TypeError):
+            raise ValueError("Некорректный курсор поиска.")
+
+    @staticmethod
+    def _total(hits: dict) -> dict:
+        total = hits.get("total", {"value": 0, "relation": "eq"})
+        return {"total": total["value"], "total_exact": total["relation"] == "eq"}
+
+    @classmethod
+    async def _search_pit(cls, body: dict, pit_id: str, search_after: Optional[list], size: int,
+                          filter_path: str) -> dict:
+        body = {**body, "size": size, "pit": {"id": pit_id, "keep_alive": settings.ELASTIC_PIT_KEEP_ALIVE}}
+        if search_after is not None:
+            body["search_after"] = search_after
+        try:
+            return await cls._client.search(body=body, filter_path=filter_path)
+        except NotFoundError:
+            raise ValueError("Курсор поиска устарел, начните поиск заново.")
+
     @classmethod
-    async def add_data(cls, index_name: str, id_image: int, tags_image: List[str]):
+    async def search_page(cls, search_string: str, index_name: str, page: int, page_size: int,
+                          cursor: Optional[str] = None) -> SearchPage:
+        """Одна страница поиска по ключевым словам: Elasticsearch возвращает ровно page_size документов.
+
+        Страницы в пределах ELASTIC_MAX_RESULT_WINDOW запрашиваются через from/size, более глубокие без курсора
+        отклоняются (ValueError). cursor ("*" - с начала выдачи, иначе next_cursor предыдущего ответа) использует
+        search_after поверх point-in-time, page при этом не учитывается; point-in-time закрывается на последней
+        странице.
+
+        В режиме SEARCH_TAGS_MATCH=exact теги ищутся по нормализованному значению целиком, неточный поиск
+        выполняется, только если точных совпадений нет; выбранный вариант сохраняется в курсоре."""
+        tags = await cls.extract_tags(search_string)
+        fuzzy = settings.SEARCH_TAGS_MATCH == "fuzzy"
+        # total точный до ELASTIC_TRACK_TOTAL_HITS, дальше Elasticsearch возвращает нижнюю границу (relation gte)
+        body = {"_source": ["postgresql_id"], "track_total_hits": settings.ELASTIC_TRACK_TOTAL_HITS}
+        offset = page_size * (page - 1)
+
+        if cursor is None and offset + page_size <= settings.ELASTIC_MAX_RESULT_WINDOW:
+            body.update({"from": offset, "size": page_size, "sort": [{"_score": {"order": "desc"}}]})
+            response = await cls._client.search(index=index_name,
+                                                body={**body, "query": cls.build_query(tags, fuzzy)},
+                                                filter_path=_PAGE_FILTER_PATH)
+            if not fuzzy and not response.get("hits", {}).get("total", {}).get("value"):
+                response = await cls._client.search(index=index_name,
+                                                    body={**body, "query": cls.build_query(tags, fuzzy=True)},
+                                                    filter_path=_PAGE_FILTER_PATH)
+            hits = response.get("hits", {})
+            return SearchPage(
+                ids=[hit["_source"]["postgresql_id"] for hit in hits.get("hits", [])],
+                **cls._total(hits)
+            )
+
+        if cursor is None:
+            raise ValueError(f"Страницы глубже {settings.ELASTIC_MAX_RESULT_WINDOW} результатов доступны только "
+                             f"по курсору: передайте cursor=* и затем next_cursor предыдущего ответа.")
+
+        if cursor == "*":
+            if not fuzzy:
+                count = await cls._client.count(index=index_name, query=cls.build_query(tags, fuzzy=False))
+                fuzzy = count["count"] == 0
+            response = await cls._client.open_point_in_time(index=index_name,
+                                                             keep_alive=settings.ELASTIC_PIT_KEEP_ALIVE)
+            pit_id, search_after = response["id"], None
+        else:
+            pit_id, search_after, fuzzy = cls.decode_cursor(cursor)
+
+        body["query"] = cls.build_query(tags, fuzzy)
+        # _shard_doc - уникальный порядок документов внутри point-in-time для search_after
+        body["sort"] = [{"_score": {"order": "desc"}}, {"_shard_doc": "asc"}]
+
+        response = await cls._search_pit(body, pit_id, search_after, page_size, filter_path=_PAGE_FILTER_PATH)
+        hits = response.get("hits", {})
+        documents = hits.get("hits", [])
+        next_cursor = None
+        if len(documents) == page_size:
+            next_cursor = cls.encode_cursor(response["pit_id"], documents[-1]["sort"], fuzzy)
+        else:
+            # Выдача закончилась: point-in-time больше не нужен, не ждем истечения keep_alive
+            await cls._close_pit(response.get("pit_id", pit_id))
+        return SearchPage(ids=[hit["_source"]["postgresql_id"] for hit in documents], **cls._total(hits),
+                          next_cursor=next_cursor)
+
+    @classmethod
+    async def _close_pit(cls, pit_id: str):
+        try:
+            await cls._client.close_point_in_time(id=pit_id)
+        except Exception as e:
+            logger.warning(f"Не удалось закрыть point-in-time: {e}")
+
+    @classmethod
+    async def add_data(cls, index_name: str, id_image: int, tags_image: List[str],
+                       tag_ids: Optional[List[int]] = None, refresh: Union[bool, str] = False):
+        """Индексирует изображение. refresh="wait_for" - дождаться, пока документ станет виден поиску
+        (запись через API сразу после этого сбрасывает кэш выдачи); скрипт парсинга не ждет refresh."""
         test_data = [
             {
                 "_index": index_name,
                 "_id": id_image,
                 "_source": {
                     "tags": tags_image,
+                    "tag_ids": tag_ids or [],
                     "postgresql_id": id_image
                 }
             }
         ]
 
         try:
+            if tag_ids is None:
+                # id тегов для фильтрации по тегам; теги уже сохранены в PostgreSQL вместе с изображением
+                test_data[0]["_source"]["tag_ids"] = list((await TagsQuery.get_ids_by_names(tags_image)).values())
             # Используем bulk для массовой загрузки данных
-            helpers.bulk(cls._client, test_data)
+            await async_bulk(cls._client, test_data, refresh=refresh)
+            # Закэшированные страницы выдачи не содержат нового изображения
+            await SearchResultService.invalidate(id_image)
 
             print("Тестовые данные успешно добавлены.")
         except Exception as e:
             print(f"Ошибка при добавлении данных: {e}")
+
+
+class PicturesTotalService(metaclass=SingletonMeta):
+    """Количество изображений для просмотра без поискового запроса: оценка pg_class.reltuples,
+    закэшированная на SEARCH_BROWSE_TOTAL_TTL_SECONDS. Устаревшее значение обновляется в фоне,
+    поэтому запрос страницы выполняет один запрос к PostgreSQL."""
+    value: Optional[int] = None
+    _refresh = BackoffRefresh(settings.SEARCH_BROWSE_TOTAL_TTL_SECONDS, "Pictures total")
+
+    @classmethod
+    async def get(cls) -> int:
+        if cls.value is None:
+            await cls._load()
+        else:
+            cls._refresh.schedule(cls._load)
+        return cls.value
+
+    @classmethod
+    async def _load(cls):
+        cls.value = await PicturesQuery.get_estimated_total()
+        cls._refresh.touch()
@@ -0,0 +1,56 @@
+import asyncio
+from typing import List, Optional, Tuple
+
+from src.config import settings
+from src.database.cii_db.queries import TagsQuery
+from src.utils.background import BackoffRefresh, SharedLoad
+from src.utils.prefix_index import PrefixIndex
+from src.utils.singleton_meta import SingletonMeta
+
+__all__ = ['TagSuggestService']
+
+
+class TagSuggestService(metaclass=SingletonMeta):
+    """Подсказки тегов по префиксу из индекса в памяти процесса, без запросов к PostgreSQL и Elasticsearch.
+
+    Индекс загружается из базы при первом запросе. Новые теги добавляются сразу (подписчик новых тегов
+    TransactionSessionQuery), количество изображений по тегам обновляется в фоне раз
+    в SEARCH_SUGGEST_REFRESH_SECONDS."""
+    index: Optional[PrefixIndex] = None
+    _load = SharedLoad()
+    _refresh = BackoffRefresh(settings.SEARCH_SUGGEST_REFRESH_SECONDS, "Tag suggestions")
+
+    @classmethod
+    async def get_index(cls) -> PrefixIndex:
+        if cls.index is None:
+            await cls._load.run(cls._load_index)
+        else:
+            cls._refresh.schedule(cls._refresh_counts)
+        return cls.index
+
+    @classmethod
+    async def _load_index(cls):
+        tags = await TagsQuery.get_picture_counts()
+        cls.index = await asyncio.to_thread(PrefixIndex, tags)
+        cls._refresh.touch()
+
+    @classmethod
+    async def _refresh_counts(cls):
+        tags = await TagsQuery.get_picture_counts()
+        for tag_id, name, count in tags:
+            # Теги, добавленные другими процессами (скрипт парсинга)
+            if tag_id not in cls.index:
+                cls.index.add(tag_id, name, count)
+        cls.index.set_counts({tag_id: count for tag_id, _, count in tags})
+
+    @classmethod
+    async def add_tags(cls, tags: List[Tuple[int, str]]):
+        """Новые теги созданы вместе с изображением, поэтому начальное количество - 1.
+        До первой загрузки индекса ничего не делает: теги будут прочитаны из базы вместе с остальными."""
+        if cls.index is not None:
+            for tag_id, name in tags:
+                cls.index.add(tag_id, name, 1)
+
+    @classmethod
+    async def suggest(cls, prefix: str, limit: int) -> List[Tuple[int, str, int]]:
+        return (await cls.get_index()).suggest(prefix, limit)
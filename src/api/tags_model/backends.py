@@ -0,0 +1,120 @@
+from typing import Callable, Sequence, Union
+
+import numpy as np
+import torch
+
+from src.clip import load_model as load_clip_model
+from src.vit import load_model as load_vit_model
+
+__all__ = ['TorchViTRunner', 'TorchClipRunner', 'OnnxRunner', 'quantize_dynamic_int8',
+           'ClipEmbedder', 'load_vit_runner', 'load_clip_runner', 'load_clip_embedder']
+
+PixelValues = Union[torch.Tensor, np.ndarray]
+
+
+def quantize_dynamic_int8(model):
+    """Динамическая int8 квантизация линейных слоев (веса int8, активации квантуются на лету).
+    Исходная модель не изменяется."""
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class TorchViTRunner:
+    """Forward ViTForImageClassification, возвращает логиты (N, num_tags)."""
+
+    def __init__(self, model):
+        self.model = model.eval()
+
+    def __call__(self, pixel_values: PixelValues) -> np.ndarray:
+        if isinstance(pixel_values, np.ndarray):
+            pixel_values = torch.from_numpy(pixel_values)
+        with torch.no_grad():
+            return self.model(pixel_values).logits.cpu().numpy()
+
+
+class TorchClipRunner:
+    """Forward визуальной части CLIP и классификатора, возвращает логиты (N, num_tags)."""
+
+    def __init__(self, model):
+        self.model = model.eval()
+
+    def __call__(self, pixel_values: PixelValues) -> np.ndarray:
+        if isinstance(pixel_values, np.ndarray):
+            pixel_values = torch.from_numpy(pixel_values)
+        with torch.no_grad():
+            features = self.model.get_image_features(pixel_values)
+            return self.model.classifier(features).cpu().numpy()
+
+
+class ClipEmbedder:
+    """Обе башни одного контрастивного чекпоинта CLIP: эмбеддинги изображений и строк (N, projection_dim)
+    без нормализации лежат в одном пространстве. Визуальная часть классификатора дообучается только
+    по BCE тегов, поэтому ее эмбеддинги с текстовыми не сравниваются."""
+
+    def __init__(self, model, tokenizer):
+        self.model = model.eval()
+        self.tokenizer = tokenizer
+
+    def embed(self, pixel_values: PixelValues) -> np.ndarray:
+        if isinstance(pixel_values, np.ndarray):
+            pixel_values = torch.from_numpy(pixel_values)
+        with torch.no_grad():
+            return self.model.get_image_features(pixel_values).cpu().numpy()
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        inputs = self.tokenizer(list(texts), padding=True, truncation=True, return_tensors="pt")
+        with torch.no_grad():
+            return self.model.get_text_features(**inputs).cpu().numpy()
+
+
+class OnnxRunner:
+    """Forward экспортированного ONNX графа через onnxruntime на CPU.
+    Граф должен иметь вход pixel_values и выход logits (см. src/vit/export_onnx.py, src/clip/export_onnx.py)."""
+
+    def __init__(self, path: str, intra_op_threads: int = 0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads > 0:
+            options.intra_op_num_threads = intra_op_threads
+        self.path = path
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+    def __call__(self, pixel_values: PixelValues) -> np.ndarray:
+        if isinstance(pixel_values, torch.Tensor):
+            pixel_values = pixel_values.numpy()
+        pixel_values = np.ascontiguousarray(pixel_values, dtype=np.float32)
+        logits, = self.session.run(["logits"], {"pixel_values": pixel_values})
+        return logits
+
+
+def load_vit_runner(path: str, backend: str, quantize: bool, intra_op_threads: int = 0
+                    ) -> Callable[[PixelValues], np.ndarray]:
+    """Раннер ViT из локальных артефактов выбранным бэкендом."""
+    if backend == "onnx":
+        onnx_file = "model.int8.onnx" if quantize else "model.onnx"
+        return OnnxRunner(f"{path}/{onnx_file}", intra_op_threads=intra_op_threads)
+    model = load_vit_model(path)
+    if quantize:
+        model = quantize_dynamic_int8(model)
+    return TorchViTRunner(model)
+
+
+def load_clip_runner(path: str, backend: str, quantize: bool, intra_op_threads: int = 0
+                     ) -> Callable[[PixelValues], np.ndarray]:
+    """Раннер CLIP из локальных артефактов выбранным бэкендом."""
+    if backend == "onnx":
+        onnx_file = "model.int8.onnx" if quantize else "model.onnx"
+        return OnnxRunner(f"{path}/{onnx_file}", intra_op_threads=intra_op_threads)
+    model = load_clip_model(path)
+    if quantize:
+        model = quantize_dynamic_int8(model)
+    return TorchClipRunner(model)
+
+
+def load_clip_embedder(name: str) -> ClipEmbedder:
+    """Контрастивный чекпоинт CLIP (имя на Hugging Face Hub или локальный каталог) для эмбеддингов
+    zero-shot разметки и поиска. Дообученный классификатор CLIP_MODEL_PATH здесь не используется."""
+    from transformers import CLIPModel, CLIPTokenizerFast
+
+    return ClipEmbedder(CLIPModel.from_pretrained(name), CLIPTokenizerFast.from_pretrained(name))
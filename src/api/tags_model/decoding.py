@@ -0,0 +1,62 @@
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+__all__ = ['TagDecoder', 'ScoredTags', 'combine_scored_tags']
+
+ScoredTags = List[Tuple[str, float]]
+
+
+class TagDecoder:
+    """Векторизованное декодирование логитов в теги с вероятностями.
+
+    Имена тегов хранятся в numpy массиве в порядке выходов классификатора; top-k выбирается через
+    argpartition (O(num_tags)), сортируются только выбранные k элементов."""
+
+    def __init__(self, tags: Sequence[str]):
+        self.names = np.asarray(tags, dtype=object)
+
+    def __len__(self):
+        return len(self.names)
+
+    @staticmethod
+    def probabilities(logits: np.ndarray) -> np.ndarray:
+        # Сигмоида через tanh не переполняется на больших по модулю логитах
+        return 0.5 * (1.0 + np.tanh(0.5 * np.asarray(logits, dtype=np.float32)))
+
+    def decode(self, logits: np.ndarray, top_k: Optional[int] = None,
+               threshold: Optional[float] = None) -> ScoredTags:
+        """Без top_k возвращает все теги с вероятностью не ниже threshold, без threshold - теги с логитом
+        больше 0 (прежний порог). С top_k возвращает k самых вероятных тегов, отфильтрованных
+        по threshold, если он задан (то же сравнение >=). Результат отсортирован по убыванию вероятности."""
+        probs = self.probabilities(logits)
+
+        if top_k is None:
+            # Порог по умолчанию сравнивается с логитами: в float32 сигмоида округляет логиты порядка 1e-8
+            # до 0.5, и сравнение probs > 0.5 отбросило бы такие теги
+            indices = np.flatnonzero(np.asarray(logits) > 0 if threshold is None else probs >= threshold)
+        else:
+            k = min(top_k, probs.shape[0])
+            if k <= 0:
+                return []
+            indices = np.argpartition(-probs, k - 1)[:k]
+            if threshold is not None:
+                indices = indices[probs[indices] >= threshold]
+
+        indices = indices[np.argsort(-probs[indices], kind="stable")]
+        return list(zip(self.names[indices].tolist(), probs[indices].tolist()))
+
+
+def combine_scored_tags(first: Optional[ScoredTags], second: Optional[ScoredTags], operation: str) -> ScoredTags:
+    """Пересечение (минимальная вероятность) или объединение (максимальная вероятность) тегов двух моделей.
+    Если теги одной из моделей не вычислялись (каскад без второй стадии), возвращаются теги другой."""
+    if first is None or second is None:
+        return list(first if second is None else second)
+    first_scores, second_scores = dict(first), dict(second)
+    if operation == "intersection":
+        combined = {tag: min(score, second_scores[tag]) for tag, score in first_scores.items() if tag in second_scores}
+    else:
+        combined = dict(second_scores)
+        for tag, score in first_scores.items():
+            combined[tag] = max(score, combined.get(tag, score))
+    return sorted(combined.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,89 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import torch
+
+from src.logger import logger
+from src.utils.singleton_meta import SingletonMeta
+
+__all__ = ['InferenceExecutor']
+
+
+class InferenceExecutor(metaclass=SingletonMeta):
+    """Выделенный пул потоков для forward моделей, чтобы torch не блокировал event loop."""
+    _executor: Optional[ThreadPoolExecutor] = None
+    _workers: int = 0
+    _torch_threads: int = 0
+
+    # Метрики очереди
+    _pending: int = 0
+    _running: int = 0
+    _completed: int = 0
+    _max_pending: int = 0
+    _lock = threading.Lock()
+
+    @classmethod
+    def start(cls, workers: int = 1, torch_threads: int = 0):
+        """Создает пул; torch_threads > 0 фиксирует число intra-op потоков torch."""
+        if cls._executor is not None:
+            return
+
+        if torch_threads > 0:
+            torch.set_num_threads(torch_threads)
+        cls._torch_threads = torch.get_num_threads()
+        cls._workers = max(1, workers)
+        cls._executor = ThreadPoolExecutor(max_workers=cls._workers, thread_name_prefix="inference")
+        logger.info("InferenceExecutor started", extra={
+            "workers": cls._workers,
+            "torch_threads": cls._torch_threads,
+        })
+
+    @classmethod
+    def shutdown(cls):
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=True, cancel_futures=True)
+            cls._executor = None
+
+    @classmethod
+    async def run(cls, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Выполняет func в пуле инференса и ожидает результат без блокировки event loop."""
+        if cls._executor is None:
+            cls.start()
+
+        cls._pending += 1
+        cls._max_pending = max(cls._max_pending, cls._pending)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(cls._executor, functools.partial(cls._call, func, *args, **kwargs))
+        finally:
+            cls._pending -= 1
+
+    @classmethod
+    def _call(cls, func: Callable[..., Any], *args, **kwargs) -> Any:
+        with cls._lock:
+            cls._running += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with cls._lock:
+                cls._running -= 1
+                cls._completed += 1
+
+    @classmethod
+    def queue_depth(cls) -> int:
+        """Количество задач, ожидающих свободного потока."""
+        return max(0, cls._pending - cls._running)
+
+    @classmethod
+    def stats(cls) -> Dict[str, int]:
+        return {
+            "workers": cls._workers,
+            "torch_threads": cls._torch_threads,
+            "queue_depth": cls.queue_depth(),
+            "running": cls._running,
+            "completed": cls._completed,
+            "max_pending": cls._max_pending,
+        }
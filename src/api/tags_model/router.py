@@ -1,33 +1,77 @@
+import asyncio
+import json
+import os
+import tarfile
+import zipfile
 from io import BytesIO
+from typing import Iterator, List, Optional, Tuple, Union
 
-from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from fastapi.responses import StreamingResponse
 from fastapi_versioning import version
-from PIL import Image
 
 from src.api.error_handler import error_handler
-from src.api.tags_model.schemas import PredictedTagsResponse
-from src.api.tags_model.service import TagsService
+from src.api.tags_model.decoding import ScoredTags, combine_scored_tags
+from src.api.tags_model.schemas import (CombinedTagsResponse,
+                                        PredictedTagsResponse,
+                                        ScoredTagSchema,
+                                        TagsOutputRequestSchema)
+from src.api.tags_model.service import TagsModelName, TagsService
+from src.api.tags_model.zero_shot import ZeroShotService
+from src.config import settings
 from src.logger import logger
 
 __all__ = ('router',)
 router = APIRouter(tags=["Models for create tags"], prefix="/tags_models")
 
 
+def _to_schema(scored_tags: ScoredTags) -> List[ScoredTagSchema]:
+    return [ScoredTagSchema(tag=tag, score=score) for tag, score in scored_tags]
+
+
+_CASCADE_DESCRIPTION = "Каскад: вторая модель только при неуверенности первой (по умолчанию TAGS_CASCADE)"
+
+
+def _combined_response(filename: str, vit_tags: Optional[ScoredTags], clip_tags: Optional[ScoredTags],
+                       operation: str) -> CombinedTagsResponse:
+    combined_tags = combine_scored_tags(vit_tags, clip_tags, operation)
+    return CombinedTagsResponse(
+        filename=filename,
+        predicted_tags=[tag for tag, _ in combined_tags],
+        scored_tags=_to_schema(combined_tags),
+        vit_tags=[tag for tag, _ in vit_tags or []],
+        clip_tags=[tag for tag, _ in clip_tags or []],
+        second_stage=vit_tags is not None and clip_tags is not None
+    )
+
+
+@router.get("/stats")
+@version(1)
+async def get_stats():
+    """Метрики инференса: глубина очереди пула, количество выполненных задач и т.п."""
+    return TagsService.stats()
+
+
 @router.post("/vit", response_model=PredictedTagsResponse)
 @version(1)
-async def upload_image_vit(file: UploadFile = File(...)):
+async def upload_image_vit(
+        file: UploadFile = File(...),
+        output: TagsOutputRequestSchema = Depends(TagsOutputRequestSchema)
+):
     if file is None or file.content_type not in ["image/jpeg", "image/png"]:
         raise HTTPException(status_code=400, detail="Только JPEG и PNG изображения поддерживаются.")
 
     try:
         image_data = await file.read()
-        image = Image.open(BytesIO(image_data))
 
-        predicted_tags = await TagsService.predict_tags_vit(image)
+        predicted_tags = await TagsService.predict_tags_vit(
+            image_data, top_k=output.top_k, threshold=output.threshold
+        )
 
         return PredictedTagsResponse(
             filename=file.filename,
-            predicted_tags=predicted_tags[0]
+            predicted_tags=[tag for tag, _ in predicted_tags],
+            scored_tags=_to_schema(predicted_tags)
         )
     except Exception as e:
         logger.exception(e)
@@ -36,72 +80,271 @@ async def upload_image_vit(file: UploadFile = File(...)):
 
 @router.post("/clip", response_model=PredictedTagsResponse)
 @version(1)
-async def upload_image_clip(file: UploadFile):
+async def upload_image_clip(
+        file: UploadFile,
+        output: TagsOutputRequestSchema = Depends(TagsOutputRequestSchema)
+):
     if file is None or file.content_type not in ["image/jpeg", "image/png"]:
         raise HTTPException(status_code=400, detail="Только JPEG и PNG изображения поддерживаются.")
 
     try:
         image_data = await file.read()
-        image = Image.open(BytesIO(image_data))
 
-        predicted_tags = await TagsService.predict_tags_clip(image)
+        predicted_tags = await TagsService.predict_tags_clip(
+            image_data, top_k=output.top_k, threshold=output.threshold
+        )
 
         return PredictedTagsResponse(
             filename=file.filename,
-            predicted_tags=predicted_tags[0]
+            predicted_tags=[tag for tag, _ in predicted_tags],
+            scored_tags=_to_schema(predicted_tags)
         )
     except Exception as e:
         logger.exception(e)
         raise HTTPException(status_code=500, detail="Ошибка при обработке изображения.")
 
 
-@router.post("/combined/intersection", response_model=PredictedTagsResponse)
+@router.post("/zero_shot", response_model=PredictedTagsResponse)
 @version(1)
-async def upload_image_intersection(file: UploadFile = File(...)):
+async def upload_image_zero_shot(
+        file: UploadFile = File(...),
+        output: TagsOutputRequestSchema = Depends(TagsOutputRequestSchema)
+):
+    """Zero-shot разметка по всем тегам базы: score - косинусная близость изображения и названия тега
+    (threshold по умолчанию ZERO_SHOT_THRESHOLD)."""
     if file is None or file.content_type not in ["image/jpeg", "image/png"]:
         raise HTTPException(status_code=400, detail="Только JPEG и PNG изображения поддерживаются.")
 
     try:
         image_data = await file.read()
-        image = Image.open(BytesIO(image_data))
-
-        # Получаем предсказанные теги обеих моделей
-        vit_tags = await TagsService.predict_tags_vit(image)
-        clip_tags = await TagsService.predict_tags_clip(image)
 
-        # Вычисляем пересечение
-        intersection_tags = list(set(vit_tags[0]) & set(clip_tags[0]))
+        predicted_tags = await ZeroShotService.predict(
+            image_data, top_k=output.top_k, threshold=output.threshold
+        )
 
         return PredictedTagsResponse(
             filename=file.filename,
-            predicted_tags=intersection_tags
+            predicted_tags=[tag for tag, _ in predicted_tags],
+            scored_tags=_to_schema(predicted_tags)
         )
     except Exception as e:
         logger.exception(e)
         raise HTTPException(status_code=500, detail="Ошибка при обработке изображения.")
 
 
-@router.post("/combined/union", response_model=PredictedTagsResponse)
+@router.post("/combined/intersection", response_model=CombinedTagsResponse)
 @version(1)
-async def upload_image_union(file: UploadFile = File(...)):
+async def upload_image_intersection(
+        file: UploadFile = File(...),
+        output: TagsOutputRequestSchema = Depends(TagsOutputRequestSchema),
+        cascade: Optional[bool] = Query(default=None, description=_CASCADE_DESCRIPTION)
+):
     if file is None or file.content_type not in ["image/jpeg", "image/png"]:
         raise HTTPException(status_code=400, detail="Только JPEG и PNG изображения поддерживаются.")
 
     try:
         image_data = await file.read()
-        image = Image.open(BytesIO(image_data))
 
-        # Получаем предсказанные теги обеих моделей
-        vit_tags = await TagsService.predict_tags_vit(image)
-        clip_tags = await TagsService.predict_tags_clip(image)
+        # Получаем предсказанные теги обеих моделей (общая предобработка, модели работают параллельно,
+        # в каскадном режиме вторая модель выполняется только при неуверенности первой)
+        vit_tags, clip_tags = await TagsService.predict_tags_combined(
+            image_data, top_k=output.top_k, threshold=output.threshold, cascade=cascade
+        )
 
-        # Вычисляем объединение
-        union_tags = list(set(vit_tags[0]).union(set(clip_tags[0])))
+        # Вычисляем пересечение
+        return _combined_response(file.filename, vit_tags, clip_tags, "intersection")
+    except Exception as e:
+        logger.exception(e)
+        raise HTTPException(status_code=500, detail="Ошибка при обработке изображения.")
 
-        return PredictedTagsResponse(
-            filename=file.filename,
-            predicted_tags=union_tags
+
+@router.post("/combined/union", response_model=CombinedTagsResponse)
+@version(1)
+async def upload_image_union(
+        file: UploadFile = File(...),
+        output: TagsOutputRequestSchema = Depends(TagsOutputRequestSchema),
+        cascade: Optional[bool] = Query(default=None, description=_CASCADE_DESCRIPTION)
+):
+    if file is None or file.content_type not in ["image/jpeg", "image/png"]:
+        raise HTTPException(status_code=400, detail="Только JPEG и PNG изображения поддерживаются.")
+
+    try:
+        image_data = await file.read()
+
+        # Получаем предсказанные теги обеих моделей (общая предобработка, модели работают параллельно,
+        # в каскадном режиме вторая модель выполняется только при неуверенности первой)
+        vit_tags, clip_tags = await TagsService.predict_tags_combined(
+            image_data, top_k=output.top_k, threshold=output.threshold, cascade=cascade
         )
+
+        # Вычисляем объединение
+        return _combined_response(file.filename, vit_tags, clip_tags, "union")
     except Exception as e:
         logger.exception(e)
         raise HTTPException(status_code=500, detail="Ошибка при обработке изображения.")
+
+
+ARCHIVE_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed", "application/x-tar", "application/gzip",
+                         "application/x-gzip", "application/x-gtar"}
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+
+def _is_archive(data: bytes) -> bool:
+    return zipfile.is_zipfile(BytesIO(data)) or tarfile.is_tarfile(BytesIO(data))
+
+
+# Элемент пакетной разметки: имя файла и содержимое или ошибка извлечения из архива
+BatchItem = Tuple[str, Union[bytes, Exception]]
+
+
+class ArchiveLimitError(ValueError):
+    pass
+
+
+def _iter_archive_images(filename: str, data: bytes) -> Iterator[BatchItem]:
+    """Извлекает изображения из zip/tar архива, не распаковывая его на диск.
+
+    Размер распакованного файла (TAGS_ARCHIVE_MAX_MEMBER_BYTES), суммарный размер
+    (TAGS_ARCHIVE_MAX_TOTAL_BYTES) и количество изображений (TAGS_ARCHIVE_MAX_MEMBERS) ограничены.
+    Поврежденный или слишком большой файл возвращается как ошибка, остальные файлы архива обрабатываются;
+    при превышении общих ограничений или повреждении каталога архива извлечение прекращается."""
+    total_size, count = 0, 0
+
+    def check_limits(name: str, size: int) -> Optional[Exception]:
+        nonlocal total_size, count
+        if size > settings.TAGS_ARCHIVE_MAX_MEMBER_BYTES:
+            return ArchiveLimitError(f"Файл {name} больше {settings.TAGS_ARCHIVE_MAX_MEMBER_BYTES} байт.")
+        total_size += size
+        count += 1
+        if total_size > settings.TAGS_ARCHIVE_MAX_TOTAL_BYTES or count > settings.TAGS_ARCHIVE_MAX_MEMBERS:
+            raise ArchiveLimitError(f"Архив {filename} превышает ограничения на размер или количество файлов.")
+        return None
+
+    try:
+        if zipfile.is_zipfile(BytesIO(data)):
+            with zipfile.ZipFile(BytesIO(data)) as archive:
+                for member in archive.infolist():
+                    if member.is_dir() or os.path.splitext(member.filename)[1].lower() not in IMAGE_EXTENSIONS:
+                        continue
+                    # file_size - заявленный размер; ZipExtFile не читает больше него
+                    error = check_limits(member.filename, member.file_size)
+                    try:
+                        yield member.filename, error or archive.read(member)
+                    except Exception as e:
+                        yield member.filename, e
+            return
+
+        with tarfile.open(fileobj=BytesIO(data), mode="r:*") as archive:
+            for member in archive:
+                if not member.isfile() or os.path.splitext(member.name)[1].lower() not in IMAGE_EXTENSIONS:
+                    continue
+                error = check_limits(member.name, member.size)
+                try:
+                    yield member.name, error or archive.extractfile(member).read()
+                except Exception as e:
+                    yield member.name, e
+    except Exception as e:
+        yield filename, e
+
+
+def _iter_batches(items: Iterator[BatchItem], batch_size: int) -> Iterator[List[BatchItem]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@router.post("/batch")
+@version(1)
+async def upload_images_batch(
+        files: List[UploadFile] = File(..., description="Изображения JPEG/PNG или zip/tar архивы с ними"),
+        model: TagsModelName = Query(default="vit", description="Модель или комбинация моделей"),
+        batch_size: int = Query(default=settings.TAGS_BATCH_SIZE, description="Размер батча инференса", ge=1, le=128),
+        output: TagsOutputRequestSchema = Depends(TagsOutputRequestSchema),
+):
+    """Пакетная разметка изображений. Результат отдается потоком NDJSON: одна строка на изображение,
+    строки пачки отправляются сразу после ее обработки."""
+    # Файлы формы закрываются до начала отдачи потока, поэтому содержимое читается здесь
+    uploads = []
+    for file in files:
+        # Имя файла нужно для определения архива и для строк ответа
+        if not file.filename:
+            raise HTTPException(status_code=400, detail="У загруженного файла не указано имя.")
+        if file.content_type in ["image/jpeg", "image/png"]:
+            uploads.append((file.filename, await file.read(), False))
+        elif file.content_type in ARCHIVE_CONTENT_TYPES or file.filename.lower().endswith((".zip", ".tar", ".tar.gz", ".tgz")):
+            data = await file.read()
+            if not _is_archive(data):
+                raise HTTPException(status_code=400, detail=f"Не удалось прочитать архив {file.filename}.")
+            uploads.append((file.filename, data, True))
+        else:
+            raise HTTPException(status_code=400, detail="Только JPEG и PNG изображения или zip/tar архивы поддерживаются.")
+
+    def iter_images() -> Iterator[BatchItem]:
+        for filename, data, is_archive in uploads:
+            if is_archive:
+                yield from _iter_archive_images(filename, data)
+            else:
+                yield filename, data
+
+    async def predict_batch(batch: List[BatchItem]) -> List[Union[dict, Exception]]:
+        """Инференс только для успешно извлеченных файлов, ошибки извлечения остаются на своих местах."""
+        results: List[Union[dict, Exception]] = [data if isinstance(data, Exception) else None for _, data in batch]
+        indices = [index for index, result in enumerate(results) if result is None]
+        if indices:
+            predicted = await TagsService.predict_tags_batch(
+                model, [batch[index][1] for index in indices], top_k=output.top_k, threshold=output.threshold
+            )
+            for index, result in zip(indices, predicted):
+                results[index] = result
+        return results
+
+    def start_batch(batch: Optional[List[BatchItem]]) -> Optional[asyncio.Task]:
+        if batch is None:
+            return None
+        return asyncio.create_task(predict_batch(batch))
+
+    async def stream_results():
+        batches = _iter_batches(iter_images(), batch_size)
+        # Распаковка архива выполняется в отдельном потоке, чтобы не блокировать event loop
+        current = await asyncio.to_thread(next, batches, None)
+        pending = start_batch(current)
+
+        try:
+            while pending is not None:
+                try:
+                    results = await pending
+                except Exception as e:
+                    logger.exception(e)
+                    results = [e] * len(current)
+
+                # Следующая пачка уходит в инференс, пока текущая отдается клиенту
+                upcoming = await asyncio.to_thread(next, batches, None)
+                pending = start_batch(upcoming)
+
+                for (filename, _), result in zip(current, results):
+                    if isinstance(result, ArchiveLimitError):
+                        line = {"filename": filename, "error": str(result)}
+                    elif isinstance(result, Exception):
+                        line = {"filename": filename, "error": "Ошибка при обработке изображения."}
+                    else:
+                        line = {
+                            "filename": filename,
+                            "predicted_tags": [tag for tag, _ in result["scored_tags"]],
+                            "scored_tags": [{"tag": tag, "score": score} for tag, score in result["scored_tags"]],
+                        }
+                        if "vit_tags" in result:
+                            line["vit_tags"] = [tag for tag, _ in result["vit_tags"]]
+                            line["clip_tags"] = [tag for tag, _ in result["clip_tags"]]
+                    yield json.dumps(line, ensure_ascii=False) + "\n"
+                current = upcoming
+        finally:
+            # Клиент отключился: инференс следующей пачки больше не нужен
+            if pending is not None and not pending.done():
+                pending.cancel()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
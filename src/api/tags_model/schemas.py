@@ -1,8 +1,28 @@
-from typing import List
+from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+
+class TagsOutputRequestSchema(BaseModel):
+    top_k: Optional[int] = Field(default=None, description="Вернуть k самых вероятных тегов", ge=1, le=1000)
+    threshold: Optional[float] = Field(
+        default=None, description="Минимальная вероятность тега (по умолчанию 0.5 без top_k)", ge=0, le=1
+    )
+
+
+class ScoredTagSchema(BaseModel):
+    tag: str
+    score: float
 
 
 class PredictedTagsResponse(BaseModel):
     filename: str
     predicted_tags: List[str]
+    scored_tags: List[ScoredTagSchema] = []
+
+
+class CombinedTagsResponse(PredictedTagsResponse):
+    vit_tags: List[str]
+    clip_tags: List[str]
+    # False, если в каскадном режиме вторая модель не понадобилась (ее список тегов пуст)
+    second_stage: bool = True
@@ -1,75 +1,547 @@
-import torch
-from PIL import Image
-from sklearn.preprocessing import MultiLabelBinarizer
-from transformers import CLIPProcessor, ViTFeatureExtractor
+import asyncio
+import hashlib
+import os
+from typing import Callable, Dict, List, Literal, Optional, Tuple, Union
 
+import numpy as np
+
+from src.api.tags_model.backends import (load_clip_embedder,
+                                         load_clip_runner, load_vit_runner)
+from src.api.tags_model.decoding import (ScoredTags, TagDecoder,
+                                         combine_scored_tags)
+from src.api.tags_model.executor import InferenceExecutor
 from src.clip import load_classes as load_clip_classes
-from src.clip import load_model as load_clip_model
+from src.config import settings
+from src.inference_server.client import RemoteClipEmbedder, RemoteRunner
 from src.logger import logger
+from src.utils.background import SharedLoad
+from src.utils.image_preprocessing import (CLIP_PREPROCESSOR, VIT_PREPROCESSOR,
+                                           ImageSource, preprocess_shared)
 from src.utils.singleton_meta import SingletonMeta
+from src.utils.ttl_cache import TTLCache
 from src.vit import load_classes as load_vit_classes
-from src.vit import load_model as load_vit_model
+
+
+TagsModelName = Literal["vit", "clip", "intersection", "union"]
+
+
+class BatchScheduler:
+    """Динамический микробатчинг: копит одиночные запросы в течение окна
+    (max_batch_size / max_wait_ms), выполняет один forward на весь батч
+    и раздает строки результата ожидающим обработчикам."""
+
+    def __init__(self, name: str, forward: Callable[[np.ndarray], np.ndarray],
+                 max_batch_size: int, max_wait_ms: float):
+        self.name = name
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._forward = forward
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run(), name=f"batch-scheduler-{self.name}")
+
+    async def submit(self, pixel_values: np.ndarray) -> np.ndarray:
+        """Ставит в очередь тензор одного изображения (1, C, H, W) и возвращает его логиты."""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((pixel_values, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[np.ndarray, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+
+            # Запросы, чьи обработчики уже отменены, в forward не попадают
+            batch = [(tensor, future) for tensor, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            try:
+                logits = await self._execute(np.concatenate([tensor for tensor, _ in batch]))
+            except Exception as e:
+                logger.error(f"BatchScheduler {self.name}: forward failed", exc_info=True)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for row, (_, future) in zip(logits, batch):
+                if not future.done():
+                    # Копия строки: представление держало бы в памяти (и в кэше) весь массив пачки
+                    future.set_result(row.copy())
+
+    async def _execute(self, pixel_values: np.ndarray) -> np.ndarray:
+        return await InferenceExecutor.run(self._forward, pixel_values)
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
 
 
 class TagsService(metaclass=SingletonMeta):
     _instance = None
+    _init_load = SharedLoad()
 
     vit_model = None
-    vit_processor = None
-    vit_mlb = None
+    vit_runner: Optional[Callable[[np.ndarray], np.ndarray]] = None
+    vit_decoder: Optional[TagDecoder] = None
+    vit_batcher: Optional[BatchScheduler] = None
 
     clip_model = None
-    clip_processor = None
-    clip_mlb = None
+    clip_runner: Optional[Callable[[np.ndarray], np.ndarray]] = None
+    clip_decoder: Optional[TagDecoder] = None
+    clip_batcher: Optional[BatchScheduler] = None
+
+    # Контрастивный CLIP для эмбеддингов (обе башни одного чекпоинта) загружается при первом запросе
+    clip_embedder = None
+    _clip_embedder_load = SharedLoad()
+
+    # Кэш логитов по содержимому файла
+    cache: Optional[TTLCache] = None
+    model_versions: Dict[str, str] = {}
+
+    # Счетчики каскада: запросы, запуски второй модели, вторая модель взята из кэша
+    cascade_stats: Dict[str, int] = {"requests": 0, "second_stage": 0, "second_stage_cached": 0}
+
+    @staticmethod
+    def _model_version(path: str, backend: str, quantize: bool) -> str:
+        """Версия модели: бэкенд, режим квантизации и размеры/время изменения файлов артефактов."""
+        digest = hashlib.sha1(f"{backend}:{quantize}".encode())
+        with os.scandir(path) as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                if entry.is_file() and os.path.splitext(entry.name)[1] in {".json", ".bin", ".safetensors", ".onnx"}:
+                    stat = entry.stat()
+                    digest.update(f"{entry.name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        return digest.hexdigest()[:12]
+
+    @classmethod
+    def _embedder_version(cls, name: str) -> str:
+        """Версия чекпоинта эмбеддингов: по файлам локального каталога или по имени на Hugging Face Hub."""
+        if os.path.isdir(name):
+            return cls._model_version(name, "torch", False)
+        return hashlib.sha1(name.encode()).hexdigest()[:12]
 
     @classmethod
     async def init_service(cls):
-        """Метод инициализации, вызываемый при первом использовании сервиса."""
-        if cls._instance is None:
-            cls._instance = TagsService()
-            # logger.info("Initializing TagsService...")
-            print("Initializing TagsService...")
-
-            # Загрузка модели ViT и ее параметров
-            cls.vit_model = load_vit_model('./vit-model')
-            cls.vit_processor = ViTFeatureExtractor.from_pretrained("google/vit-base-patch16-224")
-            vit_tags = load_vit_classes()
-            cls.vit_mlb = MultiLabelBinarizer(classes=vit_tags)
-            cls.vit_mlb.fit([vit_tags])
-            # logger.info("ViT model initialized successfully.")
-            print("TagsService ViT model initialized successfully.")
-
-            # Загрузка модели CLIP и ее параметров
-            cls.clip_processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
-            cls.clip_model = await load_clip_model('./clip-model')
-            clip_tags = load_clip_classes()
-            cls.clip_mlb = MultiLabelBinarizer(classes=clip_tags)
-            cls.clip_mlb.fit([clip_tags])
-            # logger.info("CLIP model initialized successfully.")
-            print('TagsService CLIP model initialized successfully.')
-
-    @classmethod
-    async def predict_tags_vit(cls, image: Image.Image):
-        """Предсказание тегов с помощью ViT."""
-        if cls.vit_model is None:
-            await cls.init_service()
-
-        image_tensor = cls.vit_processor(images=image, return_tensors="pt").pixel_values.squeeze(0).unsqueeze(0)
-        cls.vit_model.eval()
-        with torch.no_grad():
-            output = cls.vit_model(image_tensor)
-            preds = (output.logits.cpu().numpy() > 0).astype(int)
-            return cls.vit_mlb.inverse_transform(preds)
-
-    @classmethod
-    async def predict_tags_clip(cls, image: Image.Image):
+        """Метод инициализации, вызываемый при старте или первом использовании сервиса.
+        Параллельные вызовы ожидают одну и ту же загрузку. Готовность определяется только по _instance:
+        раннеры и кэш выставляются раньше планировщиков батчей, поэтому по ним проверять нельзя."""
+        if cls._instance is not None:
+            return
+        await cls._init_load.run(cls._init)
+
+    @classmethod
+    async def _init(cls):
+        # logger.info("Initializing TagsService...")
+        print("Initializing TagsService...")
+
+        InferenceExecutor.start(
+            workers=settings.INFERENCE_EXECUTOR_WORKERS,
+            torch_threads=settings.INFERENCE_TORCH_THREADS
+        )
+
+        # Повторная инициализация после ошибки: кэш предыдущей попытки закрывается
+        if cls.cache is not None:
+            cls.cache.close()
+        cls.cache = TTLCache(
+            maxsize=settings.TAGS_CACHE_SIZE,
+            ttl=settings.TAGS_CACHE_TTL_SECONDS,
+            disk_path=settings.TAGS_CACHE_DISK_PATH
+        )
+        vit_version = cls._model_version(settings.VIT_MODEL_PATH, settings.VIT_BACKEND, settings.VIT_QUANTIZE)
+        clip_version = cls._model_version(settings.CLIP_MODEL_PATH, settings.CLIP_BACKEND, settings.CLIP_QUANTIZE)
+        embedder_version = cls._embedder_version(settings.CLIP_EMBEDDING_MODEL)
+        cls.model_versions = {"vit": vit_version, "clip": clip_version, "clip-embed": embedder_version,
+                              "clip-text": embedder_version}
+
+        # Модели загружаются параллельно в отдельных потоках, затем прогреваются
+        await asyncio.gather(
+            asyncio.to_thread(cls._load_vit),
+            asyncio.to_thread(cls._load_clip),
+        )
+        await asyncio.gather(
+            InferenceExecutor.run(cls._warmup, cls.vit_runner),
+            InferenceExecutor.run(cls._warmup, cls.clip_runner),
+        )
+
+        cls.vit_batcher = BatchScheduler(
+            name="vit",
+            forward=cls._forward_vit,
+            max_batch_size=settings.INFERENCE_MAX_BATCH_SIZE,
+            max_wait_ms=settings.INFERENCE_MAX_WAIT_MS
+        )
+        cls.clip_batcher = BatchScheduler(
+            name="clip",
+            forward=cls._forward_clip,
+            max_batch_size=settings.INFERENCE_MAX_BATCH_SIZE,
+            max_wait_ms=settings.INFERENCE_MAX_WAIT_MS
+        )
+        cls._instance = TagsService()
+        print("TagsService initialized and warmed up.")
+
+    @classmethod
+    def _load_vit(cls):
+        """Загрузка модели ViT и ее параметров только из локальных артефактов
+        (или подключение к процессу инференса, если задан INFERENCE_SERVER_SOCKET)."""
+        if settings.INFERENCE_SERVER_SOCKET:
+            cls.vit_runner = RemoteRunner(settings.INFERENCE_SERVER_SOCKET, "vit",
+                                          timeout=settings.INFERENCE_SERVER_TIMEOUT)
+        else:
+            cls.vit_runner = load_vit_runner(settings.VIT_MODEL_PATH, settings.VIT_BACKEND, settings.VIT_QUANTIZE,
+                                             intra_op_threads=settings.INFERENCE_TORCH_THREADS)
+        cls.vit_model = getattr(cls.vit_runner, "model", None)
+        cls.vit_decoder = TagDecoder(load_vit_classes(settings.VIT_MODEL_PATH))
+        # logger.info("ViT model initialized successfully.")
+        print(f"TagsService ViT model initialized successfully ({cls._backend_name('vit')}).")
+
+    @classmethod
+    def _load_clip(cls):
+        """Загрузка модели CLIP и ее параметров только из локальных артефактов
+        (или подключение к процессу инференса, если задан INFERENCE_SERVER_SOCKET)."""
+        if settings.INFERENCE_SERVER_SOCKET:
+            cls.clip_runner = RemoteRunner(settings.INFERENCE_SERVER_SOCKET, "clip",
+                                           timeout=settings.INFERENCE_SERVER_TIMEOUT)
+        else:
+            cls.clip_runner = load_clip_runner(settings.CLIP_MODEL_PATH, settings.CLIP_BACKEND, settings.CLIP_QUANTIZE,
+                                               intra_op_threads=settings.INFERENCE_TORCH_THREADS)
+        cls.clip_model = getattr(cls.clip_runner, "model", None)
+        cls.clip_decoder = TagDecoder(load_clip_classes(settings.CLIP_MODEL_PATH))
+        # logger.info("CLIP model initialized successfully.")
+        print(f"TagsService CLIP model initialized successfully ({cls._backend_name('clip')}).")
+
+    @staticmethod
+    def _backend_name(model: Literal["vit", "clip"]) -> str:
+        if settings.INFERENCE_SERVER_SOCKET:
+            return f"remote {settings.INFERENCE_SERVER_SOCKET}"
+        if model == "vit":
+            return f"{settings.VIT_BACKEND}{', int8' if settings.VIT_QUANTIZE else ''}"
+        return f"{settings.CLIP_BACKEND}{', int8' if settings.CLIP_QUANTIZE else ''}"
+
+    @staticmethod
+    def _warmup(runner: Callable[[np.ndarray], np.ndarray]):
+        """Прогревочный forward на фиктивном батче: инициализация ядер и аллокаторов до первого запроса."""
+        for batch_size in (1, settings.INFERENCE_MAX_BATCH_SIZE):
+            runner(np.zeros((batch_size, 3, VIT_PREPROCESSOR.size, VIT_PREPROCESSOR.size), dtype=np.float32))
+
+    @classmethod
+    async def close_service(cls):
+        """Останавливает планировщики батчей и пул инференса."""
+        for batcher in (cls.vit_batcher, cls.clip_batcher):
+            if batcher is not None:
+                await batcher.close()
+        InferenceExecutor.shutdown()
+        if cls.cache is not None:
+            cls.cache.close()
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {
+            "executor": InferenceExecutor.stats(),
+            "cache": cls.cache.stats() if cls.cache is not None else None,
+            "cascade": {
+                **cls.cascade_stats,
+                "second_stage_ratio": round(cls.cascade_stats["second_stage"] / cls.cascade_stats["requests"], 4)
+                if cls.cascade_stats["requests"] else 0.0,
+            },
+        }
+
+    @classmethod
+    def _preprocess_vit(cls, image: ImageSource) -> np.ndarray:
+        return VIT_PREPROCESSOR.preprocess_one(image)
+
+    @classmethod
+    def _preprocess_clip(cls, image: ImageSource) -> np.ndarray:
+        return CLIP_PREPROCESSOR.preprocess_one(image)
+
+    @classmethod
+    def _preprocess_combined(cls, image: ImageSource) -> Tuple[np.ndarray, np.ndarray]:
+        """Общая предобработка для обеих моделей: одно декодирование и одна конвертация в RGB,
+        resize/crop и нормализация - как у каждой модели по отдельности."""
+        return preprocess_shared(image, VIT_PREPROCESSOR, CLIP_PREPROCESSOR)
+
+    @classmethod
+    def _forward_vit(cls, pixel_values: np.ndarray) -> np.ndarray:
+        """Батчевый forward ViT выбранным бэкендом, возвращает логиты (N, num_tags)."""
+        return cls.vit_runner(pixel_values)
+
+    @classmethod
+    def _forward_clip(cls, pixel_values: np.ndarray) -> np.ndarray:
+        """Батчевый forward CLIP (визуальная часть + классификатор), возвращает логиты (N, num_tags)."""
+        return cls.clip_runner(pixel_values)
+
+    @classmethod
+    def _cache_key(cls, model_key: str, digest: str) -> str:
+        """Ключ кэша: вариант модели (с учетом предобработки), версия артефактов и sha256 байтов файла."""
+        return f"{model_key}:{cls.model_versions[model_key]}:{digest}"
+
+    @classmethod
+    async def _predict_logits(cls, model_key: Literal["vit", "clip"], image_data: bytes) -> np.ndarray:
+        """Логиты одной модели для файла; при попадании в кэш декодирование и инференс пропускаются."""
+        key = cls._cache_key(model_key, hashlib.sha256(image_data).hexdigest())
+        logits = await cls.cache.aget(key)
+        if logits is not None:
+            return logits
+
+        if model_key == "vit":
+            preprocess, batcher = cls._preprocess_vit, cls.vit_batcher
+        else:
+            preprocess, batcher = cls._preprocess_clip, cls.clip_batcher
+
+        pixel_values = await asyncio.to_thread(preprocess, image_data)
+        logits = await batcher.submit(pixel_values)
+        await cls.cache.aset(key, logits)
+        return logits
+
+    @classmethod
+    async def predict_tags_vit(cls, image_data: bytes, top_k: Optional[int] = None,
+                               threshold: Optional[float] = None) -> ScoredTags:
+        """Предсказание тегов с помощью ViT: список (тег, вероятность) по убыванию вероятности."""
+        await cls.init_service()
+
+        logits = await cls._predict_logits("vit", image_data)
+        return cls.vit_decoder.decode(logits, top_k=top_k, threshold=threshold)
+
+    @classmethod
+    async def predict_tags_clip(cls, image_data: bytes, top_k: Optional[int] = None,
+                                threshold: Optional[float] = None) -> ScoredTags:
         """Метод предсказания тегов, требующий инициализации сервиса."""
-        if cls.clip_model is None:
-            await cls.init_service()
-
-        image_input = cls.clip_processor(images=image, return_tensors="pt").pixel_values
-        with torch.no_grad():
-            features = cls.clip_model.get_image_features(image_input)
-            outputs = cls.clip_model.classifier(features)
-            preds = (outputs.cpu().numpy() > 0).astype(int)
-            return cls.clip_mlb.inverse_transform(preds)
+        await cls.init_service()
+
+        logits = await cls._predict_logits("clip", image_data)
+        return cls.clip_decoder.decode(logits, top_k=top_k, threshold=threshold)
+
+    @classmethod
+    async def embed_image(cls, image_data: bytes) -> np.ndarray:
+        """Эмбеддинг изображения визуальной частью CLIP_EMBEDDING_MODEL (projection_dim,), без нормализации.
+        Лежит в одном пространстве с embed_text."""
+        await cls.init_service()
+
+        key = cls._cache_key("clip-embed", hashlib.sha256(image_data).hexdigest())
+        embedding = await cls.cache.aget(key)
+        if embedding is None:
+            await cls.init_clip_embedder()
+            pixel_values = await asyncio.to_thread(cls._preprocess_clip, image_data)
+            embedding = (await InferenceExecutor.run(cls.clip_embedder.embed, pixel_values))[0].copy()
+            await cls.cache.aset(key, embedding)
+        return embedding
+
+    @classmethod
+    async def init_clip_embedder(cls):
+        """Загрузка контрастивного CLIP для эмбеддингов; параллельные вызовы ожидают одну загрузку."""
+        if cls.clip_embedder is not None:
+            return
+        await cls._clip_embedder_load.run(lambda: asyncio.to_thread(cls._load_clip_embedder))
+
+    @classmethod
+    def _load_clip_embedder(cls):
+        if settings.INFERENCE_SERVER_SOCKET:
+            cls.clip_embedder = RemoteClipEmbedder(settings.INFERENCE_SERVER_SOCKET,
+                                                   timeout=settings.INFERENCE_SERVER_TIMEOUT)
+        else:
+            cls.clip_embedder = load_clip_embedder(settings.CLIP_EMBEDDING_MODEL)
+        print(f"TagsService CLIP embedder initialized successfully ({settings.CLIP_EMBEDDING_MODEL}).")
+
+    @classmethod
+    async def embed_text(cls, texts: List[str], batch_size: int = 256) -> np.ndarray:
+        """Эмбеддинги строк текстовой частью CLIP_EMBEDDING_MODEL (N, projection_dim), без нормализации.
+        Кэшируются по строке; промахи кэша кодируются пачками по batch_size."""
+        await cls.init_service()
+        await cls.init_clip_embedder()
+
+        keys = [cls._cache_key("clip-text", hashlib.sha256(text.encode()).hexdigest()) for text in texts]
+        embeddings = await cls.cache.aget_many(keys)
+        missing = [index for index, embedding in enumerate(embeddings) if embedding is None]
+
+        for start in range(0, len(missing), batch_size):
+            indices = missing[start:start + batch_size]
+            encoded = await InferenceExecutor.run(cls.clip_embedder, [texts[index] for index in indices])
+            for row, index in enumerate(indices):
+                embeddings[index] = encoded[row].copy()
+            await cls.cache.aset_many({keys[index]: embeddings[index] for index in indices})
+        return np.stack(embeddings) if embeddings else np.empty((0, 0), dtype=np.float32)
+
+    @classmethod
+    def _is_uncertain(cls, logits: np.ndarray, top_k: Optional[int] = None,
+                      threshold: Optional[float] = None) -> bool:
+        """Неуверен ли первый этап каскада в тегах, которые могут попасть в ответ.
+
+        С top_k проверяются только k самых вероятных тегов. Полоса неопределенности (LOW, HIGH) задана
+        вокруг 0.5; при указанном threshold она сдвигается так, чтобы ее центром был порог: ответ меняют
+        только теги рядом с порогом (с top_k и без него)."""
+        probs = TagDecoder.probabilities(logits)
+        low, high = settings.TAGS_CASCADE_LOW, settings.TAGS_CASCADE_HIGH
+        if threshold is not None:
+            low, high = threshold - (0.5 - low), threshold + (high - 0.5)
+        if top_k is not None:
+            k = min(top_k, probs.shape[0])
+            if k <= 0:
+                return False
+            probs = probs[np.argpartition(-probs, k - 1)[:k]]
+        return bool(np.any((probs > low) & (probs < high)))
+
+    @classmethod
+    async def predict_tags_combined(cls, image_data: bytes, top_k: Optional[int] = None,
+                                    threshold: Optional[float] = None, cascade: Optional[bool] = None
+                                    ) -> Tuple[Optional[ScoredTags], Optional[ScoredTags]]:
+        """Предсказание тегов обеими моделями: общая предобработка и параллельный forward.
+        Возвращает теги ViT и теги CLIP.
+
+        В каскадном режиме (по умолчанию TAGS_CASCADE) сначала выполняется TAGS_CASCADE_FIRST_MODEL,
+        вторая модель - только при неуверенности первой или если ее логиты уже есть в кэше;
+        иначе вместо тегов второй модели возвращается None."""
+        await cls.init_service()
+        cascade = settings.TAGS_CASCADE if cascade is None else cascade
+
+        digest = hashlib.sha256(image_data).hexdigest()
+        keys = {"vit": cls._cache_key("vit", digest), "clip": cls._cache_key("clip", digest)}
+        batchers = {"vit": cls.vit_batcher, "clip": cls.clip_batcher}
+        logits = dict(zip(keys, await cls.cache.aget_many(list(keys.values()))))
+        inputs: Optional[asyncio.Future] = None
+
+        async def forward(name: str):
+            nonlocal inputs
+            if logits[name] is not None:
+                return
+            # Предобработка выполняется один раз и только если нужен хотя бы один forward
+            if inputs is None:
+                inputs = asyncio.ensure_future(asyncio.to_thread(cls._preprocess_combined, image_data))
+            vit_input, clip_input = await inputs
+            logits[name] = await batchers[name].submit(vit_input if name == "vit" else clip_input)
+            await cls.cache.aset(keys[name], logits[name])
+
+        if cascade:
+            first = settings.TAGS_CASCADE_FIRST_MODEL
+            second = "clip" if first == "vit" else "vit"
+            await forward(first)
+            cls.cascade_stats["requests"] += 1
+            if logits[second] is not None:
+                cls.cascade_stats["second_stage_cached"] += 1
+            elif cls._is_uncertain(logits[first], top_k=top_k, threshold=threshold):
+                cls.cascade_stats["second_stage"] += 1
+                await forward(second)
+        else:
+            await asyncio.gather(forward("vit"), forward("clip"))
+
+        vit_logits, clip_logits = logits["vit"], logits["clip"]
+        return (
+            cls.vit_decoder.decode(vit_logits, top_k=top_k, threshold=threshold) if vit_logits is not None else None,
+            cls.clip_decoder.decode(clip_logits, top_k=top_k, threshold=threshold) if clip_logits is not None else None,
+        )
+
+    @classmethod
+    def _preprocess_batch(cls, jobs: List[Tuple[bytes, bool, bool]], shared: bool):
+        """Декодирует и подготавливает пачку изображений. jobs - (байты, нужен ViT, нужен CLIP);
+        битые файлы попадают в errors."""
+        vit_rows, vit_indices, clip_rows, clip_indices, errors = [], [], [], [], {}
+        for index, (image_data, need_vit, need_clip) in enumerate(jobs):
+            if not need_vit and not need_clip:
+                continue
+            try:
+                if shared:
+                    vit_input, clip_input = cls._preprocess_combined(image_data)
+                else:
+                    vit_input = cls._preprocess_vit(image_data) if need_vit else None
+                    clip_input = cls._preprocess_clip(image_data) if need_clip else None
+            except Exception as e:
+                errors[index] = e
+                continue
+
+            if need_vit:
+                vit_rows.append(vit_input)
+                vit_indices.append(index)
+            if need_clip:
+                clip_rows.append(clip_input)
+                clip_indices.append(index)
+
+        vit_input = np.concatenate(vit_rows) if vit_rows else None
+        clip_input = np.concatenate(clip_rows) if clip_rows else None
+        return (vit_input, vit_indices), (clip_input, clip_indices), errors
+
+    @classmethod
+    async def predict_tags_batch(
+            cls, model: TagsModelName, images: List[bytes], top_k: Optional[int] = None,
+            threshold: Optional[float] = None
+    ) -> List[Union[Dict[str, ScoredTags], Exception]]:
+        """Предсказание тегов для пачки изображений одним forward на модель (только для промахов кэша).
+        Для каждого изображения возвращает словарь с тегами или исключение."""
+        await cls.init_service()
+
+        uses_vit = model != "clip"
+        uses_clip = model != "vit"
+        shared = uses_vit and uses_clip
+
+        digests = [hashlib.sha256(image_data).hexdigest() for image_data in images]
+        vit_keys = [cls._cache_key("vit", digest) for digest in digests]
+        clip_keys = [cls._cache_key("clip", digest) for digest in digests]
+        vit_logits = await cls.cache.aget_many(vit_keys) if uses_vit else [None] * len(images)
+        clip_logits = await cls.cache.aget_many(clip_keys) if uses_clip else [None] * len(images)
+
+        jobs = [
+            (image_data, uses_vit and vit_logits[i] is None, uses_clip and clip_logits[i] is None)
+            for i, image_data in enumerate(images)
+        ]
+        vit_job, clip_job, errors = await asyncio.to_thread(cls._preprocess_batch, jobs, shared)
+
+        async def forward(forward_fn, job, keys, logits_rows):
+            pixel_values, indices = job
+            if pixel_values is None:
+                return
+            logits = await InferenceExecutor.run(forward_fn, pixel_values)
+            for row, index in enumerate(indices):
+                logits_rows[index] = logits[row].copy()
+            await cls.cache.aset_many({keys[index]: logits_rows[index] for index in indices})
+
+        await asyncio.gather(
+            forward(cls._forward_vit, vit_job, vit_keys, vit_logits),
+            forward(cls._forward_clip, clip_job, clip_keys, clip_logits),
+        )
+
+        results: List[Union[Dict[str, ScoredTags], Exception]] = []
+        for index in range(len(images)):
+            if index in errors:
+                results.append(errors[index])
+                continue
+
+            vit_tags = cls.vit_decoder.decode(vit_logits[index], top_k, threshold) if uses_vit else None
+            clip_tags = cls.clip_decoder.decode(clip_logits[index], top_k, threshold) if uses_clip else None
+            if model == "vit":
+                results.append({"scored_tags": vit_tags})
+            elif model == "clip":
+                results.append({"scored_tags": clip_tags})
+            else:
+                results.append({
+                    "scored_tags": combine_scored_tags(vit_tags, clip_tags, model),
+                    "vit_tags": vit_tags,
+                    "clip_tags": clip_tags,
+                })
+        return results
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.api.tags_model.decoding import ScoredTags
+from src.api.tags_model.service import TagsService
+from src.config import settings
+from src.utils.embedding_store import EmbeddingStore
+from src.utils.singleton_meta import SingletonMeta
+
+__all__ = ['ZeroShotTagger', 'ZeroShotService']
+
+
+class ZeroShotTagger:
+    """Матрица эмбеддингов названий тегов (текстовая часть CLIP) и их названия.
+
+    Эмбеддинги хранятся в EmbeddingStore по id тега, названия - в names.jsonl рядом с ним;
+    оба файла только дописываются, поэтому новые теги добавляются без пересчета матрицы."""
+
+    def __init__(self, path: str):
+        # Тегов на порядки меньше, чем изображений: всегда полный перебор без IVF индекса
+        self.store = EmbeddingStore(path, ivf_min_size=2 ** 62)
+        self._names_path = os.path.join(path, "names.jsonl")
+        self._names: Dict[int, str] = {}
+        self._names_size = 0
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __contains__(self, tag_id: int) -> bool:
+        return tag_id in self.store
+
+    def _refresh_names(self):
+        if not os.path.exists(self._names_path) or os.path.getsize(self._names_path) == self._names_size:
+            return
+        with open(self._names_path, "rb") as file:
+            file.seek(self._names_size)
+            data = file.read()
+        # Другой процесс может дописывать файл прямо сейчас: читаются только строки, завершенные переводом строки
+        complete = data[:data.rfind(b"\n") + 1]
+        for line in complete.splitlines():
+            item = json.loads(line)
+            self._names[item["id"]] = item["name"]
+        self._names_size += len(complete)
+
+    def add(self, tags: Sequence[Tuple[int, str]], embeddings: np.ndarray):
+        # Названия пишутся раньше эмбеддингов: тег с эмбеддингом всегда имеет название
+        with open(self._names_path, "a") as file:
+            file.writelines(json.dumps({"id": tag_id, "name": name}) + "\n" for tag_id, name in tags)
+        self.store.add([tag_id for tag_id, _ in tags], embeddings)
+
+    def predict(self, image_embedding: np.ndarray, top_k: Optional[int] = None,
+                threshold: Optional[float] = None) -> ScoredTags:
+        """Теги по косинусной близости эмбеддинга изображения с названиями тегов (одно матричное умножение).
+        Без top_k и threshold используется ZERO_SHOT_THRESHOLD."""
+        if threshold is None and top_k is None:
+            threshold = settings.ZERO_SHOT_THRESHOLD
+        # Количество тегов - после подхвата строк, дописанных другими процессами
+        self.store.refresh()
+        ids, scores = self.store.search(image_embedding, top_k or len(self.store))
+        if threshold is not None:
+            keep = scores >= threshold
+            ids, scores = ids[keep], scores[keep]
+
+        self._refresh_names()
+        return [(self._names[tag_id], score) for tag_id, score in zip(ids.tolist(), scores.tolist())]
+
+
+class ZeroShotService(metaclass=SingletonMeta):
+    """Zero-shot разметка: новые теги становятся доступны сразу после вычисления эмбеддинга названия,
+    без переобучения классификаторов."""
+    tagger: Optional[ZeroShotTagger] = None
+    _lock: Optional[asyncio.Lock] = None
+
+    @classmethod
+    def get_tagger(cls) -> ZeroShotTagger:
+        if cls.tagger is None:
+            cls.tagger = ZeroShotTagger(settings.ZERO_SHOT_PATH or os.path.join(settings.CLIP_MODEL_PATH,
+                                                                                "tag_embeddings"))
+        return cls.tagger
+
+    @staticmethod
+    def prompt(name: str) -> str:
+        return settings.ZERO_SHOT_PROMPT.format(name.replace("_", " "))
+
+    @classmethod
+    async def add_tags(cls, tags: List[Tuple[int, str]]):
+        """Эмбеддинги для тегов, которых еще нет в матрице (подписчик новых тегов TransactionSessionQuery)."""
+        if cls._lock is None:
+            cls._lock = asyncio.Lock()
+        # Последовательное добавление: один и тот же тег не кодируется дважды
+        async with cls._lock:
+            tagger = cls.get_tagger()
+            tags = [(tag_id, name) for tag_id, name in tags if tag_id not in tagger]
+            if not tags:
+                return
+            embeddings = await TagsService.embed_text([cls.prompt(name) for _, name in tags])
+            await asyncio.to_thread(tagger.add, tags, embeddings)
+
+    @classmethod
+    async def predict(cls, image_data: bytes, top_k: Optional[int] = None,
+                      threshold: Optional[float] = None) -> ScoredTags:
+        image_embedding = await TagsService.embed_image(image_data)
+        return await asyncio.to_thread(cls.get_tagger().predict, image_embedding, top_k, threshold)
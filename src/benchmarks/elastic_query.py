@@ -0,0 +1,201 @@
+# elastic_query.py
+import argparse
+import asyncio
+import itertools
+import json
+import subprocess
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+from elasticsearch.helpers import async_streaming_bulk
+
+from src.api.search.index import (TAGS_INDEX_MAPPINGS, TAGS_INDEX_SETTINGS,
+                                  exact_tags_query, fuzzy_tags_query)
+from src.config import settings
+from src.utils.elastic_service import BaseElasticService
+
+WORDS = [
+    "long", "short", "blue", "red", "black", "white", "green", "school", "night", "sky", "hair", "eyes",
+    "dress", "uniform", "city", "forest", "cat", "dog", "girl", "boy", "smile", "sword", "flower", "rain",
+    "snow", "sea", "beach", "mountain", "street", "window", "book", "hat", "glasses", "ribbon", "tree", "moon",
+]
+
+
+def legacy_query(tags: List[str]) -> dict:
+    """Запрос до явной схемы индекса: match с fuzziness AUTO по динамическому полю tags."""
+    return {"bool": {"must": [{"match": {"tags": {"query": " ".join(tags), "operator": "or", "fuzziness": "AUTO"}}}]}}
+
+
+# Вариант индекса: (явная схема, функция запроса)
+CASES: Dict[str, tuple] = {
+    "dynamic_legacy": (False, legacy_query),
+    "mapped_fuzzy": (True, fuzzy_tags_query),
+    "mapped_exact": (True, exact_tags_query),
+}
+
+
+def make_vocabulary(size: int, rng: np.random.Generator) -> List[str]:
+    """Синтетические теги вида word_word_123: как и настоящие, многие из нескольких слов через подчеркивание."""
+    names = set()
+    while len(names) < size:
+        first, second = rng.choice(WORDS, 2)
+        names.add(f"{first}_{second}_{len(names)}" if rng.random() < 0.6 else f"{first}{len(names)}")
+    return sorted(names)
+
+
+def zipf_sampler(size: int, rng: np.random.Generator, exponent: float = 1.1) -> Callable[[int], np.ndarray]:
+    """Номера тегов с частотой по закону Ципфа; обратная функция распределения считается один раз."""
+    cdf = np.cumsum(1.0 / np.arange(1, size + 1) ** exponent)
+    cdf /= cdf[-1]
+    return lambda count: np.minimum(np.searchsorted(cdf, rng.random(count)), size - 1)
+
+
+async def create_indexes(client, prefix: str, cases: List[str]):
+    for mapped in {CASES[case][0] for case in cases}:
+        index_name = f"{prefix}_{'mapped' if mapped else 'dynamic'}"
+        await client.indices.delete(index=index_name, ignore_unavailable=True)
+        body = {"settings": {**(TAGS_INDEX_SETTINGS if mapped else {}), "refresh_interval": "-1"}}
+        if mapped:
+            body["mappings"] = TAGS_INDEX_MAPPINGS
+        await client.indices.create(index=index_name, **body)
+
+
+async def load_corpus(client, index_name: str, docs: int, vocabulary: List[str], tags_per_doc: int, seed: int):
+    """Загрузка синтетических документов потоковым bulk (теги распределены по Ципфу)."""
+    rng = np.random.default_rng(seed)
+    sample = zipf_sampler(len(vocabulary), rng)
+
+    def actions():
+        for picture_id in range(docs):
+            tag_ids = np.unique(sample(rng.integers(1, tags_per_doc * 2)))
+            yield {
+                "_index": index_name,
+                "_id": picture_id,
+                "_source": {
+                    "tags": [vocabulary[i] for i in tag_ids],
+                    "tag_ids": tag_ids.tolist(),
+                    "postgresql_id": picture_id,
+                },
+            }
+
+    start = time.perf_counter()
+    async for _ in async_streaming_bulk(client, actions(), chunk_size=5000, raise_on_error=True):
+        pass
+    await client.indices.put_settings(index=index_name, settings={"refresh_interval": "1s"})
+    await client.indices.refresh(index=index_name)
+    await client.indices.forcemerge(index=index_name, max_num_segments=1)
+    print(f"{index_name}: {docs} документов за {time.perf_counter() - start:.1f} с", flush=True)
+
+
+def make_queries(count: int, vocabulary: List[str], seed: int) -> List[List[str]]:
+    """Запросы из 1-3 тегов; частые теги встречаются в запросах чаще."""
+    rng = np.random.default_rng(seed)
+    sample = zipf_sampler(len(vocabulary), rng)
+    return [[vocabulary[i] for i in sample(rng.integers(1, 4))] for _ in range(count)]
+
+
+async def run_load(client, index_name: str, build_query: Callable[[List[str]], dict], queries: List[List[str]],
+                   concurrency: int, page_size: int) -> dict:
+    latencies, took, totals = [], [], []
+    queue = iter(queries)
+
+    async def worker():
+        for tags in queue:
+            start = time.perf_counter()
+            response = await client.search(
+                index=index_name, query=build_query(tags), size=page_size, _source=["postgresql_id"],
+                track_total_hits=settings.ELASTIC_TRACK_TOTAL_HITS
+            )
+            latencies.append(time.perf_counter() - start)
+            took.append(response["took"])
+            totals.append(response["hits"]["total"]["value"])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    p50, p95, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 95, 99]).tolist()
+    return {
+        "p50_ms": round(p50, 2),
+        "p95_ms": round(p95, 2),
+        "p99_ms": round(p99, 2),
+        "es_took_avg_ms": round(float(np.mean(took)), 2),
+        "queries_per_sec": round(len(queries) / elapsed, 2),
+        "avg_total_hits": round(float(np.mean(totals)), 1),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def parse_ints(value: str) -> List[int]:
+    return [int(item) for item in value.split(",")]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Задержка запросов Elasticsearch: динамическая схема "
+                                                 "и match с fuzziness против явной схемы и точных term запросов")
+    parser.add_argument("--docs", type=int, default=1_000_000)
+    parser.add_argument("--vocabulary", type=int, default=20_000, help="Количество различных тегов")
+    parser.add_argument("--tags-per-doc", type=int, default=12)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--concurrency", type=parse_ints, default=[1, 16])
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--cases", default=",".join(CASES))
+    parser.add_argument("--index-prefix", default="cii_benchmark")
+    parser.add_argument("--skip-load", action="store_true", help="Использовать уже загруженные индексы")
+    parser.add_argument("--keep", action="store_true", help="Не удалять индексы после замера")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="elastic_query_benchmark.json")
+    args = parser.parse_args()
+
+    await BaseElasticService.connect(host=settings.ELASTIC_URL, verify_certs=False,
+                                     connections_per_node=max(args.concurrency),
+                                     request_timeout=120.0)
+    client = BaseElasticService.get_client()
+    cases = args.cases.split(",")
+
+    rng = np.random.default_rng(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    index_names = {mapped: f"{args.index_prefix}_{'mapped' if mapped else 'dynamic'}" for mapped in (False, True)}
+    try:
+        if not args.skip_load:
+            await create_indexes(client, args.index_prefix, cases)
+            for mapped in sorted({CASES[case][0] for case in cases}):
+                # Одинаковый seed - одинаковый корпус в обоих индексах
+                await load_corpus(client, index_names[mapped], args.docs, vocabulary, args.tags_per_doc, args.seed)
+
+        queries = make_queries(args.queries, vocabulary, args.seed + 1)
+        results = []
+        for case, concurrency in itertools.product(cases, args.concurrency):
+            mapped, build_query = CASES[case]
+            await run_load(client, index_names[mapped], build_query, queries[:args.warmup], concurrency,
+                           args.page_size)
+            metrics = await run_load(client, index_names[mapped], build_query, queries, concurrency, args.page_size)
+            results.append({"case": case, "docs": args.docs, "concurrency": concurrency, **metrics})
+            print(" | ".join(f"{key}={value}" for key, value in results[-1].items()), flush=True)
+    finally:
+        if not args.keep:
+            for index_name in index_names.values():
+                await client.indices.delete(index=index_name, ignore_unavailable=True)
+        await BaseElasticService.close()
+
+    with open(args.output, "w") as file:
+        json.dump({"commit": git_commit(), "created_at": time.time(), "results": results}, file, indent=2)
+    print(f"Результаты сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+"""
+Запуск программы:
+python -m src.benchmarks.elastic_query --docs 1000000 --queries 500 --concurrency 1,16
+python -m src.benchmarks.elastic_query --skip-load --keep --cases mapped_exact,mapped_fuzzy
+"""
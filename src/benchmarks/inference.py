@@ -0,0 +1,227 @@
+# inference.py
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import resource
+import subprocess
+import time
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from src.benchmarks.preprocessing import make_jpeg
+
+ENDPOINTS = ("vit", "clip", "intersection", "union")
+SIZES = [(640, 480), (1920, 1080), (4000, 3000)]
+BOUNDARY = "benchmark-boundary"
+
+
+def make_images(count: int) -> List[bytes]:
+    """Синтетические JPEG нескольких размеров. К каждому файлу дописываются байты после маркера EOI:
+    декодер их игнорирует, а sha256 файла становится уникальным (кэш к тому же отключен в run_config)."""
+    base = [make_jpeg(width, height) for width, height in SIZES]
+    return [base[i % len(base)] + i.to_bytes(8, "big") for i in range(count)]
+
+
+def multipart_body(image: bytes) -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="image.jpg"\r\n'
+        "Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + image + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+async def asgi_post(app, path: str, body: bytes) -> int:
+    """Один POST запрос напрямую в ASGI приложение (без сети), возвращает статус ответа."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"benchmark"),
+            (b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode()),
+            (b"content-length", str(len(body)).encode()),
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("benchmark", 80),
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status = 0
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+def make_callers(mode: str) -> Dict[str, Callable[[bytes], Awaitable]]:
+    from src.api.tags_model.service import TagsService
+
+    if mode == "service":
+        return {
+            "vit": TagsService.predict_tags_vit,
+            "clip": TagsService.predict_tags_clip,
+            "intersection": TagsService.predict_tags_combined,
+            "union": TagsService.predict_tags_combined,
+        }
+
+    from src.main import app
+    paths = {
+        "vit": "/api/v1/tags_models/vit",
+        "clip": "/api/v1/tags_models/clip",
+        "intersection": "/api/v1/tags_models/combined/intersection",
+        "union": "/api/v1/tags_models/combined/union",
+    }
+
+    def caller(path: str):
+        async def call(image: bytes):
+            status = await asgi_post(app, path, multipart_body(image))
+            if status != 200:
+                raise RuntimeError(f"{path}: HTTP {status}")
+        return call
+
+    return {name: caller(path) for name, path in paths.items()}
+
+
+async def run_load(call: Callable[[bytes], Awaitable], images: List[bytes], concurrency: int) -> dict:
+    """Прогон всех изображений с заданным числом одновременных запросов."""
+    latencies = []
+    queue = iter(images)
+
+    async def worker():
+        for image in queue:
+            start = time.perf_counter()
+            await call(image)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    p50, p95, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 95, 99]).tolist()
+    return {
+        "p50_ms": round(p50, 2),
+        "p95_ms": round(p95, 2),
+        "p99_ms": round(p99, 2),
+        "images_per_sec": round(len(images) / elapsed, 2),
+    }
+
+
+async def run_config(config: dict) -> List[dict]:
+    from src.api.tags_model.service import TagsService
+    from src.config import settings
+
+    # Параметры применяются до инициализации сервиса; кэш предсказаний отключен
+    settings.INFERENCE_TORCH_THREADS = config["torch_threads"]
+    settings.INFERENCE_MAX_BATCH_SIZE = config["batch_size"]
+    settings.TAGS_CACHE_SIZE = 0
+    settings.TAGS_CACHE_DISK_PATH = None
+    await TagsService.init_service()
+
+    callers = make_callers(config["mode"])
+    images = make_images(config["requests"])
+    results = []
+    for endpoint, concurrency in itertools.product(config["endpoints"], config["concurrency"]):
+        await run_load(callers[endpoint], images[:config["warmup"]], concurrency)
+        metrics = await run_load(callers[endpoint], images, concurrency)
+        results.append({
+            "mode": config["mode"],
+            "endpoint": endpoint,
+            "torch_threads": config["torch_threads"],
+            "batch_size": config["batch_size"],
+            "concurrency": concurrency,
+            "requests": config["requests"],
+            **metrics,
+        })
+        print(" | ".join(f"{key}={value}" for key, value in results[-1].items()), flush=True)
+
+    await TagsService.close_service()
+    # ru_maxrss в Linux указывается в КБ
+    peak_rss_mb = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    for result in results:
+        result["peak_rss_mb"] = peak_rss_mb
+    return results
+
+
+def run_config_process(config: dict, queue: multiprocessing.Queue):
+    queue.put(asyncio.run(run_config(config)))
+
+
+def run_isolated(config: dict) -> List[dict]:
+    """Каждая конфигурация в отдельном процессе: свой пул потоков torch и честный пиковый RSS."""
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=run_config_process, args=(config, queue))
+    process.start()
+    results = queue.get()
+    process.join()
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def parse_ints(value: str) -> List[int]:
+    return [int(item) for item in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержка и пропускная способность эндпоинтов тегов")
+    parser.add_argument("--mode", choices=["service", "asgi", "all"], default="all",
+                        help="Вызов TagsService напрямую или через ASGI приложение")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--concurrency", type=parse_ints, default=[1, 8, 32])
+    parser.add_argument("--torch-threads", type=parse_ints, default=[0], help="INFERENCE_TORCH_THREADS, через запятую")
+    parser.add_argument("--batch-sizes", type=parse_ints, default=[16], help="INFERENCE_MAX_BATCH_SIZE, через запятую")
+    parser.add_argument("--requests", type=int, default=200, help="Количество запросов на одну точку замера")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--output", default="inference_benchmark.json")
+    args = parser.parse_args()
+
+    modes = ["service", "asgi"] if args.mode == "all" else [args.mode]
+    configs: List[Tuple[str, int, int]] = list(itertools.product(modes, args.torch_threads, args.batch_sizes))
+
+    results = []
+    for mode, torch_threads, batch_size in configs:
+        results.extend(run_isolated({
+            "mode": mode,
+            "torch_threads": torch_threads,
+            "batch_size": batch_size,
+            "endpoints": args.endpoints.split(","),
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+        }))
+
+    with open(args.output, "w") as file:
+        json.dump({"commit": git_commit(), "created_at": time.time(), "results": results}, file, indent=2)
+    print(f"Результаты сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
+
+"""
+Запуск программы:
+python -m src.benchmarks.inference --mode all --concurrency 1,8,32 --torch-threads 1,4 --batch-sizes 1,16
+"""
@@ -0,0 +1,115 @@
+# model_loading.py
+import argparse
+import importlib
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from typing import Dict
+
+import psutil
+import torch
+from transformers import CLIPModel, ViTForImageClassification
+
+from src.config import settings
+
+MODELS = {
+    "vit": "src.vit.save_model",
+    "clip": "src.clip.save_model",
+}
+# Базовая модель, с которой исходный загрузчик CLIP начинал загрузку
+CLIP_BASE_MODEL = "openai/clip-vit-base-patch32"
+
+
+def prepare_checkpoints(name: str, source: str, directory: str) -> Dict[str, str]:
+    """Сохраняет модель из source в двух форматах: старый pytorch_model.bin и safetensors."""
+    module = importlib.import_module(MODELS[name])
+    model = module.load_model(source)
+    tags = module.load_classes(source)
+
+    safetensors_path = os.path.join(directory, name, "safetensors")
+    module.save_model(model, tags=tags, path=safetensors_path)
+
+    legacy_path = os.path.join(directory, name, "legacy")
+    if name == "vit":
+        model.save_pretrained(legacy_path, safe_serialization=False)
+    else:
+        os.makedirs(legacy_path, exist_ok=True)
+        torch.save(model.state_dict(), f"{legacy_path}/pytorch_model.bin")
+        model.config.save_pretrained(legacy_path)
+    with open(f"{safetensors_path}/classes.json") as source_file, open(f"{legacy_path}/classes.json", "w") as target:
+        target.write(source_file.read())
+    return {"pytorch_model.bin": legacy_path, "safetensors": safetensors_path}
+
+
+def load_original_model(name: str, path: str):
+    """Исходный загрузчик (до safetensors): ViT - from_pretrained без low_cpu_mem_usage; CLIP - базовая модель
+    from_pretrained, новый классификатор и полный torch.load state dict поверх нее.
+    Количество тегов берется из classes.json, а не из базы, как в исходном коде: на замер это не влияет."""
+    module = importlib.import_module(MODELS[name])
+    if name == "vit":
+        return ViTForImageClassification.from_pretrained(path)
+    model = CLIPModel.from_pretrained(CLIP_BASE_MODEL)
+    model.classifier = torch.nn.Linear(model.config.projection_dim, len(module.load_classes(path)))
+    model.load_state_dict(torch.load(f"{path}/pytorch_model.bin"))
+    return model
+
+
+def measure_load(name: str, path: str, original: bool, queue: multiprocessing.Queue):
+    """Выполняется в отдельном процессе, чтобы пиковый RSS относился только к одной загрузке."""
+    module = importlib.import_module(MODELS[name])
+    baseline = psutil.Process().memory_info().rss
+    start = time.perf_counter()
+    model = load_original_model(name, path) if original else module.load_model(path)
+    elapsed = time.perf_counter() - start
+    # Первый forward затрагивает все страницы весов: для mmap весов это учитывается здесь, а не при загрузке
+    with torch.no_grad():
+        if name == "vit":
+            model(torch.zeros(1, 3, 224, 224))
+        else:
+            model.classifier(model.get_image_features(torch.zeros(1, 3, 224, 224)))
+    # ru_maxrss в Linux указывается в КБ
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    queue.put({"load_s": elapsed, "peak_rss_mb": peak / 2 ** 20, "load_rss_mb": (peak - baseline) / 2 ** 20})
+
+
+def run_isolated(name: str, path: str, original: bool) -> dict:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=measure_load, args=(name, path, original, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время загрузки и пиковый RSS моделей: исходный загрузчик "
+                                                 "pytorch_model.bin, текущий загрузчик pytorch_model.bin и safetensors")
+    parser.add_argument("--model", choices=["vit", "clip", "all"], default="all")
+    args = parser.parse_args()
+
+    sources = {"vit": settings.VIT_MODEL_PATH, "clip": settings.CLIP_MODEL_PATH}
+    names = list(MODELS) if args.model == "all" else [args.model]
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'model':>5} | {'loader':>26} | {'load s':>7} | {'peak RSS MB':>11} | {'load RSS MB':>11}")
+        for name in names:
+            checkpoints = prepare_checkpoints(name, sources[name], directory)
+            # "До": исходный загрузчик на старом формате; "после": текущий загрузчик на обоих форматах
+            cases = [("original pytorch_model.bin", checkpoints["pytorch_model.bin"], True)]
+            cases += [(checkpoint_format, path, False) for checkpoint_format, path in checkpoints.items()]
+            for loader, path, original in cases:
+                result = run_isolated(name, path, original)
+                print(f"{name:>5} | {loader:>26} | {result['load_s']:7.2f} | "
+                      f"{result['peak_rss_mb']:11.0f} | {result['load_rss_mb']:11.0f}")
+
+
+if __name__ == "__main__":
+    main()
+
+"""
+Запуск программы:
+python -m src.benchmarks.model_loading --model all
+"""
@@ -0,0 +1,121 @@
+# preprocessing.py
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from src.utils.image_preprocessing import CLIP_PREPROCESSOR, VIT_PREPROCESSOR
+
+SIZES = [(1024, 768), (3000, 2000), (6000, 4000)]
+
+
+def make_jpeg(width: int, height: int, quality: int = 90) -> bytes:
+    """Синтетическое изображение: градиент с шумом, сохраненное в JPEG."""
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, np.newaxis]
+    pixels = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1)
+    pixels += rng.normal(0, 20, pixels.shape).astype(np.float32)
+    buffer = BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def max_rss_mb() -> float:
+    """Пиковый RSS процесса (МБ): в отличие от tracemalloc учитывает буферы декодирования PIL в C."""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux возвращает килобайты, macOS - байты
+    return max_rss / (2 ** 20 if sys.platform == "darwin" else 2 ** 10)
+
+
+def measure(fn: Callable[[bytes], np.ndarray], data: bytes, repeats: int) -> Tuple[float, float]:
+    """Пиковый прирост RSS (МБ) за первый вызов и среднее время (мс) на одно изображение.
+    Вызывается в отдельном процессе: пиковый RSS нельзя сбросить, поэтому каждый вариант - в новом процессе."""
+    baseline = max_rss_mb()
+    fn(data)
+    peak = max_rss_mb() - baseline
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(data)
+    return (time.perf_counter() - start) / repeats * 1000, peak
+
+
+def hf_pipelines() -> Dict[str, Callable[[bytes], np.ndarray]]:
+    """Загружаются только в процессе замера HF варианта."""
+    from transformers import CLIPProcessor, ViTFeatureExtractor
+
+    vit = ViTFeatureExtractor.from_pretrained("google/vit-base-patch16-224")
+    clip = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
+    return {
+        "hf vit": lambda data: vit(images=Image.open(BytesIO(data)).convert("RGB"), return_tensors="np").pixel_values,
+        "hf clip": lambda data: clip(images=Image.open(BytesIO(data)).convert("RGB"), return_tensors="np").pixel_values,
+    }
+
+
+def get_pipeline(name: str) -> Callable[[bytes], np.ndarray]:
+    if name.startswith("hf "):
+        return hf_pipelines()[name]
+    return {"fast vit": VIT_PREPROCESSOR.preprocess_one, "fast clip": CLIP_PREPROCESSOR.preprocess_one}[name]
+
+
+def run_worker(args):
+    """Замер одного варианта: изображение читается из файла, чтобы его генерация не попала в пиковый RSS."""
+    fn = get_pipeline(args.pipeline)
+    with open(args.image, "rb") as file:
+        data = file.read()
+    elapsed, peak = measure(fn, data, args.repeats)
+    print(json.dumps({"ms": elapsed, "peak_mb": peak}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время и пиковая память (RSS) предобработки изображений: "
+                                                 "HF процессоры и ImagePreprocessor")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--skip-hf", action="store_true", help="Не сравнивать с HF процессорами")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--pipeline", help=argparse.SUPPRESS)
+    parser.add_argument("--image", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    pipelines = ([] if args.skip_hf else ["hf vit", "hf clip"]) + ["fast vit", "fast clip"]
+    rows: List[Tuple[str, str, float, float]] = []
+    with tempfile.TemporaryDirectory() as directory:
+        for width, height in SIZES:
+            path = os.path.join(directory, f"{width}x{height}.jpg")
+            with open(path, "wb") as file:
+                file.write(make_jpeg(width, height))
+            for name in pipelines:
+                # Новый процесс на каждый вариант: пиковый RSS процесса не сбрасывается
+                output = subprocess.check_output([
+                    sys.executable, "-m", "src.benchmarks.preprocessing", "--worker", "--pipeline", name,
+                    "--image", path, "--repeats", str(args.repeats)
+                ], text=True)
+                result = json.loads(output.strip().splitlines()[-1])
+                rows.append((f"{width}x{height}", name, result["ms"], result["peak_mb"]))
+
+    print(f"{'image':>10} | {'pipeline':>10} | {'ms/image':>9} | {'peak RSS +MB':>12}")
+    for image, name, elapsed, peak in rows:
+        print(f"{image:>10} | {name:>10} | {elapsed:9.1f} | {peak:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
+
+"""
+Запуск программы:
+python -m src.benchmarks.preprocessing --repeats 10
+"""
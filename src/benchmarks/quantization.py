@@ -0,0 +1,81 @@
+# quantization.py
+import argparse
+import asyncio
+
+from torch.utils.data import DataLoader
+
+from src.api.tags_model.backends import (TorchClipRunner, TorchViTRunner,
+                                         quantize_dynamic_int8)
+from src.clip import dataset as clip_dataset
+from src.clip.save_model import load_classes as load_clip_classes
+from src.clip.save_model import load_model as load_clip_model
+from src.clip.test import evaluate_model as evaluate_clip
+from src.config import settings
+from src.utils.onnx_export import compare_latency
+from src.vit import dataset as vit_dataset
+from src.vit.evaluate import evaluate_model as evaluate_vit
+from src.vit.save_model import load_classes as load_vit_classes
+from src.vit.save_model import load_model as load_vit_model
+
+METRICS = ("accuracy", "precision", "recall", "f1")
+
+
+def print_report(name: str, fp32: dict, int8: dict, latency: dict):
+    print(f"\n=== {name}: int8 против fp32 ===")
+    for metric in METRICS:
+        print(f"{metric:>9}: fp32 {fp32[metric]:.4f} | int8 {int8[metric]:.4f} | "
+              f"delta {int8[metric] - fp32[metric]:+.4f}")
+    for batch_size, fp32_ms in latency["fp32"].items():
+        int8_ms = latency["int8"][batch_size]
+        print(f"batch={batch_size}: fp32 {fp32_ms:.1f} ms | int8 {int8_ms:.1f} ms | speedup x{fp32_ms / int8_ms:.2f}")
+
+
+async def report_vit(cnt: int, start: int, batch_size: int):
+    tags = load_vit_classes(settings.VIT_MODEL_PATH)
+    data = await vit_dataset.get_training_data(cnt=cnt, start=start)
+    dataloader = DataLoader(vit_dataset.ArtDataset(data, tag_names=tags), batch_size=batch_size, shuffle=False)
+
+    model = load_vit_model(settings.VIT_MODEL_PATH).eval()
+    quantized = quantize_dynamic_int8(model)
+
+    fp32 = await evaluate_vit(model, dataloader)
+    int8 = await evaluate_vit(quantized, dataloader)
+    latency = compare_latency({"fp32": TorchViTRunner(model), "int8": TorchViTRunner(quantized)})
+    print_report("ViT", fp32, int8, latency)
+
+
+async def report_clip(cnt: int, start: int, batch_size: int):
+    tags = load_clip_classes(settings.CLIP_MODEL_PATH)
+    data = await clip_dataset.get_training_data(cnt=cnt, start=start)
+    dataloader = DataLoader(clip_dataset.ArtDataset(data, tag_names=tags), batch_size=batch_size, shuffle=False)
+
+    model = load_clip_model(settings.CLIP_MODEL_PATH).eval()
+    quantized = quantize_dynamic_int8(model)
+
+    fp32 = await evaluate_clip(model, dataloader)
+    int8 = await evaluate_clip(quantized, dataloader)
+    latency = compare_latency({"fp32": TorchClipRunner(model), "int8": TorchClipRunner(quantized)})
+    print_report("CLIP", fp32, int8, latency)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Сравнение качества и скорости int8 и fp32 моделей тегов")
+    parser.add_argument("--model", choices=["vit", "clip", "all"], default="all")
+    parser.add_argument("--cnt", type=int, default=1000, help="Количество строк выборки из базы")
+    parser.add_argument("--start", type=int, default=0, help="Смещение выборки")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    if args.model in ("vit", "all"):
+        await report_vit(args.cnt, args.start, args.batch_size)
+    if args.model in ("clip", "all"):
+        await report_clip(args.cnt, args.start, args.batch_size)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+"""
+Запуск программы:
+python -m src.benchmarks.quantization --model all --cnt 1000
+"""
@@ -2,17 +2,14 @@
 from typing import List
 
 import numpy as np
-from PIL import Image
+import torch
 from pydantic import BaseModel
 from sklearn.preprocessing import MultiLabelBinarizer
 from torch.utils.data import Dataset
-from transformers import CLIPProcessor
 
 from src.database.cii_db.queries import TagsQuery
 from src.database.cii_db.queries.pictures import PicturesQuery
-
-# Используем CLIPProcessor для подготовки изображений
-processor = CLIPProcessor.from_pretrained('openai/clip-vit-base-patch32')
+from src.utils.image_preprocessing import CLIP_PREPROCESSOR
 
 
 class PicturesWithTagsSchema(BaseModel):
@@ -25,8 +22,8 @@ class PicturesWithTagsSchema(BaseModel):
 
 
 def process_image(image_path):
-    image = Image.open(image_path).convert("RGB")
-    return processor(images=image, return_tensors="pt").pixel_values.squeeze(0)
+    # Та же предобработка, что и в API: resize по меньшей стороне, center crop 224 и нормализация CLIP
+    return torch.from_numpy(CLIP_PREPROCESSOR.preprocess_one(image_path)[0])
 
 
 # Асинхронная функция для извлечения данных из базы данных
@@ -0,0 +1,58 @@
+# export_onnx.py
+import argparse
+
+import torch
+
+from src.api.tags_model.backends import OnnxRunner, TorchClipRunner
+from src.clip.save_model import load_model
+from src.utils.onnx_export import check_parity, compare_latency, export_onnx, quantize_onnx
+
+
+class ClipVisionClassifier(torch.nn.Module):
+    """Визуальная часть CLIP + классификатор тегов, без текстовой башни."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.vision_model = model.vision_model
+        self.visual_projection = model.visual_projection
+        self.classifier = model.classifier
+
+    def forward(self, pixel_values):
+        pooled_output = self.vision_model(pixel_values=pixel_values).pooler_output
+        return self.classifier(self.visual_projection(pooled_output))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Экспорт визуальной части CLIP и классификатора тегов в ONNX")
+    parser.add_argument("--path", default="./clip-model", help="Каталог с обученной моделью")
+    parser.add_argument("--output", default=None, help="Путь к ONNX файлу (по умолчанию <path>/model.onnx)")
+    parser.add_argument("--quantize", action="store_true", help="Дополнительно сохранить int8 версию (model.int8.onnx)")
+    args = parser.parse_args()
+    output = args.output or f"{args.path}/model.onnx"
+
+    model = load_model(args.path).eval()
+    export_onnx(ClipVisionClassifier(model), output, output_names=["logits"])
+    print(f"ONNX граф сохранен: {output}")
+
+    torch_runner = TorchClipRunner(model)
+    onnx_runner = OnnxRunner(output)
+    check_parity(torch_runner, onnx_runner)
+    runners = {"torch": torch_runner, "onnxruntime": onnx_runner}
+
+    if args.quantize:
+        quantized_output = output.replace(".onnx", ".int8.onnx")
+        quantize_onnx(output, quantized_output)
+        print(f"int8 ONNX граф сохранен: {quantized_output}")
+        runners["onnxruntime int8"] = OnnxRunner(quantized_output)
+
+    compare_latency(runners)
+
+
+if __name__ == "__main__":
+    main()
+
+"""
+Запуск программы:
+python -m src.clip.export_onnx
+python -m src.clip.export_onnx --quantize
+"""
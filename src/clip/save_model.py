@@ -1,20 +1,24 @@
-import asyncio
 import json
+import os
 from functools import lru_cache
 from typing import List
 
 import torch
-from transformers import CLIPModel
-
-from src.clip.dataset import get_all_tags
+from accelerate import init_empty_weights
+from safetensors.torch import load_file, save_model as save_safetensors
+from transformers import CLIPConfig, CLIPModel
 
 __all__ = ['save_model', 'load_model', 'load_classes']
 
+WEIGHTS_NAME = "model.safetensors"
+LEGACY_WEIGHTS_NAME = "pytorch_model.bin"
+
 
 # Сохранение модели
 def save_model(model, tags: List[str], path='./clip-model'):
-    # Сохраняем всю модель вместе с дополнительными слоями
-    torch.save(model.state_dict(), f"{path}/pytorch_model.bin")
+    # Сохраняем всю модель вместе с дополнительными слоями в safetensors (читается через mmap без копирования)
+    os.makedirs(path, exist_ok=True)
+    save_safetensors(model, f"{path}/{WEIGHTS_NAME}")
     model.config.save_pretrained(path)
 
     config_data = {"tags": tags}
@@ -22,20 +26,30 @@ def save_model(model, tags: List[str], path='./clip-model'):
         json.dump(config_data, json_file)
 
 
-# Загрузка модели
+# Загрузка модели только из локальных артефактов (config.json, веса и classes.json), без обращения к базе
 @lru_cache(maxsize=1)
-async def load_model(path='./clip-model'):
-    model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
+def load_model(path='./clip-model'):
+    config = CLIPConfig.from_pretrained(path, local_files_only=True)
+    # Количество тегов, с которыми модель обучалась
+    num_tags = len(load_classes(path))
+
+    if not os.path.exists(f"{path}/{WEIGHTS_NAME}"):
+        return _load_legacy_model(path, config, num_tags)
+
+    # Параметры создаются на meta устройстве (без выделения памяти и случайной инициализации),
+    # затем заменяются тензорами, отображенными из файла (assign=True)
+    with init_empty_weights():
+        model = CLIPModel(config)
+        model.classifier = torch.nn.Linear(model.config.projection_dim, num_tags)
+    model.load_state_dict(load_file(f"{path}/{WEIGHTS_NAME}", device="cpu"), assign=True)
+    return model
 
-    # Получаем все теги асинхронно для создания кастомного классификатора
-    tags = await get_all_tags()
-    num_tags = len(tags)
 
-    # Задаем кастомный классификатор, соответствующий количеству тегов
+def _load_legacy_model(path: str, config: CLIPConfig, num_tags: int):
+    """Чекпоинт старого формата (pytorch_model.bin): весь state dict читается в память."""
+    model = CLIPModel(config)
     model.classifier = torch.nn.Linear(model.config.projection_dim, num_tags)
-
-    # Загружаем веса модели
-    model.load_state_dict(torch.load(f"{path}/pytorch_model.bin"))
+    model.load_state_dict(torch.load(f"{path}/{LEGACY_WEIGHTS_NAME}", map_location="cpu", mmap=True, weights_only=True))
     return model
 
 
@@ -53,4 +67,4 @@ if __name__ == "__main__":
     save_model(model)
 
     # Пример загрузки модели
-    loaded_model = asyncio.run(load_model())
+    loaded_model = load_model()
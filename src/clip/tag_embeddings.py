@@ -0,0 +1,24 @@
+# tag_embeddings.py
+import asyncio
+
+from src.api.tags_model.service import TagsService
+from src.api.tags_model.zero_shot import ZeroShotService
+from src.database.cii_db.queries import TagsQuery
+
+
+async def main():
+    """Эмбеддинги названий всех тегов базы для zero-shot разметки; повторный запуск добавляет только новые."""
+    tags = await TagsQuery.find_all()
+    before = len(ZeroShotService.get_tagger())
+    await ZeroShotService.add_tags([(tag["id"], tag["name"]) for tag in tags])
+    print(f"Тегов в базе: {len(tags)}, добавлено эмбеддингов: {len(ZeroShotService.get_tagger()) - before}")
+    await TagsService.close_service()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+"""
+Запуск программы:
+python -m src.clip.tag_embeddings
+"""
@@ -46,6 +46,13 @@ async def evaluate_model(model, test_dataloader):
     print(f"F1 Score: {f1}")
     print(f"Classification Report:\n{report}")
 
+    return {
+        "accuracy": accuracy,
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+    }
+
 
 # Прогнозирование на новом изображении
 def predict_on_new_image(model, image_path, mlb):
@@ -74,7 +81,7 @@ async def main():
     num_tags = len(tags)
 
     # Загрузка модели и добавление классификатора
-    model = await load_model()
+    model = load_model()
     model.classifier = torch.nn.Linear(512, num_tags).to(model.device)
 
     data = await get_training_data(cnt=1000, start=0)
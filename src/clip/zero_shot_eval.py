@@ -0,0 +1,55 @@
+# zero_shot_eval.py
+import argparse
+import asyncio
+
+import numpy as np
+
+from src.api.tags_model.service import TagsService
+from src.api.tags_model.zero_shot import ZeroShotService
+from src.clip.dataset import get_training_data
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Точность zero-shot разметки на размеченных изображениях базы "
+                                                 "в зависимости от порога косинусной близости")
+    parser.add_argument("--count", type=int, default=500, help="Количество изображений")
+    parser.add_argument("--start", type=int, default=0)
+    parser.add_argument("--thresholds", default="0.15,0.18,0.2,0.22,0.24,0.25,0.26,0.28,0.3")
+    args = parser.parse_args()
+    thresholds = [float(value) for value in args.thresholds.split(",")]
+
+    pictures = await get_training_data(cnt=args.count, start=args.start)
+    true_positives = np.zeros(len(thresholds))
+    predicted = np.zeros(len(thresholds))
+    actual = 0
+    for picture in pictures:
+        with open(picture.path, "rb") as file:
+            image_data = file.read()
+        # Все теги со score, пороги применяются ниже
+        scored = await ZeroShotService.predict(image_data, threshold=-1.0)
+        tags = set(picture.tags)
+        actual += len(tags)
+        for index, threshold in enumerate(thresholds):
+            kept = [tag for tag, score in scored if score >= threshold]
+            predicted[index] += len(kept)
+            true_positives[index] += len(tags.intersection(kept))
+
+    print(f"Изображений: {len(pictures)}, тегов в разметке: {actual}")
+    print(f"{'threshold':>9} | {'precision':>9} | {'recall':>6} | {'f1':>6} | {'tags/img':>8}")
+    for index, threshold in enumerate(thresholds):
+        precision = true_positives[index] / max(predicted[index], 1)
+        recall = true_positives[index] / max(actual, 1)
+        f1 = 2 * precision * recall / max(precision + recall, 1e-12)
+        print(f"{threshold:9.2f} | {precision:9.3f} | {recall:6.3f} | {f1:6.3f} | "
+              f"{predicted[index] / max(len(pictures), 1):8.1f}")
+
+    await TagsService.close_service()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+"""
+Запуск программы:
+python -m src.clip.zero_shot_eval --count 500
+"""
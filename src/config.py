@@ -1,4 +1,4 @@
-from typing import Literal
+from typing import Literal, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -16,6 +16,113 @@ class Settings(BaseSettings):
     ELASTIC_HOST: str
     ELASTIC_PORT: int
     ELASTIC_INDEX: str
+    # Пул соединений асинхронного клиента Elasticsearch (на узел), таймаут запроса и повторы
+    ELASTIC_CONNECTIONS_PER_NODE: int = 25
+    ELASTIC_REQUEST_TIMEOUT: float = 10.0
+    ELASTIC_MAX_RETRIES: int = 3
+    ELASTIC_RETRY_ON_TIMEOUT: bool = True
+    # Страницы поиска глубже index.max_result_window листаются через search_after и point-in-time,
+    # время жизни point-in-time между запросами страниц
+    ELASTIC_MAX_RESULT_WINDOW: int = 10_000
+    ELASTIC_PIT_KEEP_ALIVE: str = "1m"
+    # До скольких документов Elasticsearch считает total поиска точно (дальше - нижняя граница)
+    ELASTIC_TRACK_TOTAL_HITS: int = 10_000
+
+    # Модели тегов: каталоги артефактов и бэкенд инференса
+    VIT_MODEL_PATH: str = "./vit-model"
+    CLIP_MODEL_PATH: str = "./clip-model"
+    VIT_BACKEND: Literal["torch", "onnx"] = "torch"
+    CLIP_BACKEND: Literal["torch", "onnx"] = "torch"
+    # Динамическая int8 квантизация линейных слоев (для onnx используется model.int8.onnx)
+    VIT_QUANTIZE: bool = False
+    CLIP_QUANTIZE: bool = False
+    # Контрастивный чекпоинт CLIP (имя на Hugging Face Hub или локальный каталог), из которого берутся
+    # эмбеддинги изображений и текста для zero-shot разметки и поиска. Дообученный CLIP_MODEL_PATH для этого
+    # не подходит: его визуальная часть обучена только по BCE тегов и ушла из пространства текстовой части
+    CLIP_EMBEDDING_MODEL: str = "openai/clip-vit-base-patch32"
+
+    # Микробатчинг инференса моделей тегов
+    INFERENCE_MAX_BATCH_SIZE: int = 16
+    INFERENCE_MAX_WAIT_MS: float = 10.0
+
+    # Пул потоков инференса (0 потоков torch - значение по умолчанию torch)
+    INFERENCE_EXECUTOR_WORKERS: int = 2
+    INFERENCE_TORCH_THREADS: int = 0
+
+    # Отдельный процесс инференса (src/inference_server), общий для всех воркеров API узла.
+    # Если задан путь unix сокета, модели в воркерах не загружаются
+    INFERENCE_SERVER_SOCKET: Optional[str] = None
+    INFERENCE_SERVER_TIMEOUT: float = 60.0
+
+    # Повторы фоновой загрузки моделей при старте; после последней неудачи воркер завершается
+    MODELS_LOAD_RETRIES: int = 3
+    MODELS_LOAD_RETRY_DELAY_SECONDS: float = 10.0
+
+    # Кэш предсказаний по содержимому файла (LRU + TTL, опционально на диске)
+    TAGS_CACHE_SIZE: int = 10_000
+    TAGS_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    TAGS_CACHE_DISK_PATH: Optional[str] = None
+
+    # Каскад для combined эндпоинтов: вторая модель выполняется, только если вероятность
+    # хотя бы одного тега первой модели, который может попасть в ответ (из top_k или рядом с порогом),
+    # попала в полосу неопределенности (LOW, HIGH)
+    TAGS_CASCADE: bool = False
+    TAGS_CASCADE_FIRST_MODEL: Literal["vit", "clip"] = "clip"
+    TAGS_CASCADE_LOW: float = 0.2
+    TAGS_CASCADE_HIGH: float = 0.8
+
+    # Размер батча по умолчанию для пакетной разметки
+    TAGS_BATCH_SIZE: int = 16
+    # Ограничения архивов пакетной разметки: распакованный размер файла, суммарный размер и число изображений
+    TAGS_ARCHIVE_MAX_MEMBER_BYTES: int = 50 * 1024 * 1024
+    TAGS_ARCHIVE_MAX_TOTAL_BYTES: int = 2 * 1024 * 1024 * 1024
+    TAGS_ARCHIVE_MAX_MEMBERS: int = 10_000
+
+    # Zero-shot разметка по эмбеддингам названий тегов (по умолчанию <CLIP_MODEL_PATH>/tag_embeddings);
+    # порог - косинусная близость (подобран для CLIP_EMBEDDING_MODEL по умолчанию, см. src.clip.zero_shot_eval),
+    # новые теги из парсеров добавляются автоматически
+    ZERO_SHOT_PATH: Optional[str] = None
+    ZERO_SHOT_PROMPT: str = "a picture of {}"
+    ZERO_SHOT_THRESHOLD: float = 0.25
+    ZERO_SHOT_AUTO_UPDATE: bool = True
+
+    # Хранилище эмбеддингов CLIP изображений для поиска похожих; IVF индекс строится
+    # для коллекций от EMBEDDINGS_IVF_MIN_SIZE, при поиске перебираются EMBEDDINGS_IVF_NPROBE кластеров
+    EMBEDDINGS_PATH: str = "./embeddings"
+    EMBEDDINGS_IVF_MIN_SIZE: int = 100_000
+    EMBEDDINGS_IVF_NPROBE: int = 8
+
+    # Режим поиска по тексту по умолчанию: keywords (KeyBERT + Elasticsearch), clip (текстовые эмбеддинги CLIP
+    # против эмбеддингов изображений) или hybrid (weight * cos + (1 - weight) * нормированный score Elasticsearch)
+    SEARCH_MODE: Literal["keywords", "clip", "hybrid"] = "keywords"
+    SEARCH_CLIP_TOP_K: int = 1000
+    SEARCH_FUSION_WEIGHT: float = 0.5
+    # Время жизни оценки количества изображений (pg_class.reltuples) для просмотра без запроса
+    SEARCH_BROWSE_TOTAL_TTL_SECONDS: int = 60
+
+    # Разбор поискового запроса: vocabulary (поиск известных тегов автоматом Ахо-Корасик, KeyBERT только
+    # если ни один тег не найден) или keybert (всегда KeyBERT)
+    SEARCH_QUERY_PARSER: Literal["vocabulary", "keybert"] = "vocabulary"
+    # Период фонового дочитывания тегов из базы в словарь разбора запросов (теги других воркеров и парсера)
+    SEARCH_VOCABULARY_REFRESH_SECONDS: int = 300
+    # Сопоставление тегов запроса в Elasticsearch: exact (term по нормализованному тегу, неточный поиск
+    # только если совпадений нет) или fuzzy (всегда match с fuzziness AUTO и частичными совпадениями)
+    SEARCH_TAGS_MATCH: Literal["exact", "fuzzy"] = "exact"
+    # Модель эмбеддингов KeyBERT для извлечения ключевых слов из поискового запроса
+    KEYBERT_MODEL: str = "roberta-base"
+    # Кэш ключевых слов запросов (LRU + TTL, опционально общий для воркеров sqlite файл)
+    SEARCH_KEYWORDS_CACHE_SIZE: int = 10_000
+    SEARCH_KEYWORDS_CACHE_TTL_SECONDS: int = 24 * 3600
+    SEARCH_KEYWORDS_CACHE_DISK_PATH: Optional[str] = None
+    # Кэш страниц выдачи поиска (id и total), сбрасывается при записи новых данных в этом процессе
+    SEARCH_RESULT_CACHE_SIZE: int = 10_000
+    SEARCH_RESULT_CACHE_TTL_SECONDS: int = 300
+    # Записи за это время объединяются в один сброс кэша выдачи
+    SEARCH_RESULT_INVALIDATE_DELAY_SECONDS: float = 1.0
+    # Период проверки счетчиков индексации ELASTIC_INDEX: записи других воркеров и скрипта парсинга
+    SEARCH_RESULT_GENERATION_POLL_SECONDS: float = 2.0
+    # Период фонового обновления количества изображений по тегам для подсказок /search/tags/suggest
+    SEARCH_SUGGEST_REFRESH_SECONDS: int = 300
 
     @property
     def DATABASE_URL(self):
@@ -1,7 +1,7 @@
 from typing import Dict, List
 
 from pydantic import BaseModel
-from sqlalchemy import select, func, case
+from sqlalchemy import select, func, case, text
 from sqlalchemy.exc import SQLAlchemyError
 
 from src.database.base_DAO import BaseDAO
@@ -63,6 +63,38 @@ class PicturesQuery(
                 logger.error(msg, extra=extra, exc_info=True)
                 raise CannotExecuteQueryToDatabase
 
+    @classmethod
+    async def get_pictures_paths(cls, after_id: int = 0, limit: int = 1000) -> List[Dict[str, str]]:
+        """Идентификаторы и пути изображений с id > after_id (постраничный обход по ключу)."""
+        async with cls.async_session_maker() as session:
+            try:
+                query = (
+                    select(cls.model.id, cls.model.path)
+                    .filter(cls.model.id > after_id)
+                    .order_by(cls.model.id)
+                    .limit(limit)
+                )
+                result_orm = await session.execute(query)
+                return result_orm.mappings().all()
+
+            except (SQLAlchemyError, Exception) as e:
+                await session.rollback()
+                if isinstance(e, SQLAlchemyError):
+                    msg = "PicturesQuery Database error"
+                else:
+                    msg = "PicturesQuery Unknown error"
+
+                msg += ": Cannot get_pictures_paths"
+
+                extra = {
+                    "error": e,
+                    "after_id": after_id,
+                    "limit": limit
+                }
+
+                logger.error(msg, extra=extra, exc_info=True)
+                raise CannotExecuteQueryToDatabase
+
     @classmethod
     async def get_total_by_filter(
             cls, image_ids: List[int] = None
@@ -95,6 +127,32 @@ class PicturesQuery(
                 logger.error(msg, extra=extra, exc_info=True)
                 raise CannotExecuteQueryToDatabase
 
+    @classmethod
+    async def get_estimated_total(cls) -> int:
+        """Оценка количества изображений по статистике планировщика (pg_class.reltuples) без COUNT по таблице.
+        Пока статистика не собрана (reltuples <= 0), выполняется точный подсчет."""
+        async with cls.async_session_maker() as session:
+            try:
+                query = text("SELECT reltuples::bigint AS count FROM pg_class WHERE oid = CAST(:table AS regclass)")
+                result_orm = await session.execute(query, {"table": PicturesModel.__tablename__})
+                estimate = result_orm.scalar_one()
+                if estimate > 0:
+                    return estimate
+
+                result_orm = await session.execute(select(func.count(PicturesModel.id)))
+                return result_orm.scalar_one()
+            except (SQLAlchemyError, Exception) as e:
+                await session.rollback()
+                if isinstance(e, SQLAlchemyError):
+                    msg = "PicturesQuery Database error"
+                else:
+                    msg = "PicturesQuery Unknown error"
+
+                msg += ": Cannot get_estimated_total"
+
+                logger.error(msg, extra={"error": e}, exc_info=True)
+                raise CannotExecuteQueryToDatabase
+
     @classmethod
     async def get_pictures_with_tags_by_ids(
             cls, limit: int, offset: int, image_ids: List[int] = None
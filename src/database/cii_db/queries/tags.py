@@ -1,6 +1,13 @@
+from typing import Dict, List, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+
 from src.database.base_DAO import BaseDAO
-from src.database.cii_db.models import TagsModel
+from src.database.cii_db.models import PictureToTagsModel, TagsModel
 from src.database.cii_db.schemas import TagsCreateSchema, TagsUpdateSchema
+from src.exceptions import CannotFindAllDataToDatabase
+from src.logger import logger
 
 __all__ = ['TagsQuery']
 
@@ -9,3 +16,45 @@ class TagsQuery(
     BaseDAO[TagsModel, TagsCreateSchema, TagsUpdateSchema]
 ):
     model = TagsModel
+
+    @classmethod
+    async def get_ids_by_names(cls, names: List[str]) -> Dict[str, int]:
+        """id тегов по названиям; отсутствующие в базе названия пропускаются."""
+        async with cls.async_session_maker() as session:
+            try:
+                query = select(TagsModel.name, TagsModel.id).where(TagsModel.name.in_(names))
+                result_orm = await session.execute(query)
+                return {name: tag_id for name, tag_id in result_orm.all()}
+            except (SQLAlchemyError, Exception) as e:
+                if isinstance(e, SQLAlchemyError):
+                    msg = "TagsQuery Database error"
+                else:
+                    msg = "TagsQuery Unknown error"
+
+                msg += ": Cannot get_ids_by_names"
+
+                logger.error(msg, extra={"error": e, "names": names}, exc_info=True)
+                raise CannotFindAllDataToDatabase
+
+    @classmethod
+    async def get_picture_counts(cls) -> List[Tuple[int, str, int]]:
+        """Все теги с количеством связанных изображений: (id, название, количество)."""
+        async with cls.async_session_maker() as session:
+            try:
+                query = (
+                    select(TagsModel.id, TagsModel.name, func.count(PictureToTagsModel.id_picture))
+                    .outerjoin(PictureToTagsModel, PictureToTagsModel.id_tag == TagsModel.id)
+                    .group_by(TagsModel.id, TagsModel.name)
+                )
+                result_orm = await session.execute(query)
+                return [(tag_id, name, count) for tag_id, name, count in result_orm.all()]
+            except (SQLAlchemyError, Exception) as e:
+                if isinstance(e, SQLAlchemyError):
+                    msg = "TagsQuery Database error"
+                else:
+                    msg = "TagsQuery Unknown error"
+
+                msg += ": Cannot get_picture_counts"
+
+                logger.error(msg, extra={"error": e}, exc_info=True)
+                raise CannotFindAllDataToDatabase
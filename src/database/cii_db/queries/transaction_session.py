@@ -1,4 +1,4 @@
-from typing import List
+from typing import Awaitable, Callable, List, Tuple
 
 from sqlalchemy import delete, select
 from sqlalchemy.dialects.postgresql import insert as pg_insert
@@ -13,11 +13,49 @@ from src.logger import logger
 __all__ = ['TransactionSessionQuery']
 
 
+# Обработчик новых тегов: список (id тега, название), вызывается после фиксации транзакции
+NewTagsListener = Callable[[List[Tuple[int, str]]], Awaitable[None]]
+# Обработчик добавленного или обновленного изображения: id изображения
+NewPictureListener = Callable[[int], Awaitable[None]]
+
+
 class TransactionSessionQuery(BaseDAO):
-    pass
+    _new_tags_listeners: List[NewTagsListener] = []
+    _new_picture_listeners: List[NewPictureListener] = []
+
+    @classmethod
+    def add_new_tags_listener(cls, listener: NewTagsListener):
+        """Подписка на теги, впервые добавленные в базу при вставке изображения."""
+        cls._new_tags_listeners.append(listener)
 
     @classmethod
-    async def insert_new_picture(cls, info_picture: PicturesCreateSchema, tags: List[str]):
+    def add_new_picture_listener(cls, listener: NewPictureListener):
+        """Подписка на изображения, добавленные или обновленные insert_new_picture."""
+        cls._new_picture_listeners.append(listener)
+
+    @classmethod
+    async def _notify_new_picture(cls, picture_id: int):
+        for listener in cls._new_picture_listeners:
+            try:
+                await listener(picture_id)
+            except Exception as e:
+                logger.error("TransactionSessionQuery: new picture listener failed", extra={"error": e}, exc_info=True)
+
+    @classmethod
+    async def _notify_new_tags(cls, tags: List[Tuple[int, str]]):
+        if not tags:
+            return
+        for listener in cls._new_tags_listeners:
+            try:
+                await listener(tags)
+            except Exception as e:
+                # Ошибка подписчика не отменяет уже сохраненное изображение
+                logger.error("TransactionSessionQuery: new tags listener failed", extra={"error": e}, exc_info=True)
+
+    @classmethod
+    async def insert_new_picture(cls, info_picture: PicturesCreateSchema, tags: List[str]) -> Tuple[int, List[int]]:
+        """Сохраняет изображение и его теги. Возвращает id изображения и id его тегов
+        (для индексации в Elasticsearch без повторного запроса тегов)."""
         async with cls.async_session_maker() as session:
             try:
 
@@ -83,8 +121,10 @@ class TransactionSessionQuery(BaseDAO):
                     ]
                     session.add_all(picture_to_tag_entries)
 
+                    # Атрибуты читаются до commit, после него объекты сессии истекают
+                    created_tags = [(tag.id, tag.name) for tag in new_tags]
+                    tag_ids = [tag.id for tag in all_tags.values()]
                     await session.commit()
-                    return picture_id
 
             except (SQLAlchemyError, Exception) as e:
                 await session.rollback()
@@ -107,3 +147,7 @@ class TransactionSessionQuery(BaseDAO):
 
                 logger.error(msg, extra=extra, exc_info=True)
                 raise CannotInsertDataToDatabase
+
+        await cls._notify_new_tags(created_tags)
+        await cls._notify_new_picture(picture_id)
+        return picture_id, tag_ids
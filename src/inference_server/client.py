@@ -0,0 +1,131 @@
+import socket
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import torch
+
+from src.inference_server.protocol import Frame, encode_frame, recv_frame
+
+__all__ = ['InferenceClient', 'RemoteRunner', 'RemoteClipEmbedder', 'RemoteKeywordModel']
+
+
+class InferenceClient:
+    """Синхронный клиент процесса инференса. Каждый поток держит свое соединение,
+    поэтому на одном соединении в каждый момент выполняется не больше одного запроса."""
+
+    def __init__(self, socket_path: str, timeout: float = 60.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        # Сервер может еще загружать модели: повторяем подключение до истечения timeout
+        deadline = time.monotonic() + self.timeout
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.socket_path)
+                sock.settimeout(self.timeout)
+                return sock
+            except (FileNotFoundError, ConnectionRefusedError):
+                sock.close()
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.5)
+
+    def request(self, header: Dict[str, Any], array: Optional[np.ndarray] = None) -> Frame:
+        frame = encode_frame(header, array)
+        for attempt in range(2):
+            sock = getattr(self._local, "sock", None)
+            if sock is None:
+                sock = self._local.sock = self._connect()
+            try:
+                sock.sendall(frame)
+                # Ожидание первого байта ответа без его чтения: до этого момента обрыв соединения безопасно повторить
+                if not sock.recv(1, socket.MSG_PEEK):
+                    raise ConnectionError("Inference server closed the connection")
+            except ConnectionError:
+                # Соединение разорвано до ответа (например, перезапуск сервера): одна повторная попытка
+                # с новым соединением. Таймаут не повторяется: сервер мог быть просто перегружен
+                self._drop(sock)
+                if attempt:
+                    raise
+                continue
+            except OSError:
+                self._drop(sock)
+                raise
+
+            try:
+                response, result = recv_frame(sock)
+            except OSError:
+                # Ответ получен не полностью: соединение в неизвестном состоянии, запрос не повторяется
+                self._drop(sock)
+                raise
+            break
+
+        if "error" in response:
+            raise RuntimeError(f"Inference server error: {response['error']}")
+        return response, result
+
+    def _drop(self, sock: socket.socket):
+        sock.close()
+        self._local.sock = None
+
+    def close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+
+class RemoteRunner:
+    """Раннер модели тегов в процессе инференса: тензоры (N, 3, H, W) -> логиты (N, num_tags)."""
+
+    def __init__(self, socket_path: str, model: str, timeout: float = 60.0):
+        self.model_name = model
+        self.client = InferenceClient(socket_path, timeout=timeout)
+
+    def __call__(self, pixel_values: Union[torch.Tensor, np.ndarray]) -> np.ndarray:
+        if isinstance(pixel_values, torch.Tensor):
+            pixel_values = pixel_values.numpy()
+        _, logits = self.client.request(
+            {"op": "forward", "model": self.model_name},
+            np.ascontiguousarray(pixel_values, dtype=np.float32)
+        )
+        return logits
+
+
+class RemoteClipEmbedder:
+    """Контрастивный CLIP в процессе инференса: изображения и строки -> эмбеддинги (N, projection_dim)."""
+
+    def __init__(self, socket_path: str, timeout: float = 60.0):
+        self.client = InferenceClient(socket_path, timeout=timeout)
+
+    def embed(self, pixel_values: Union[torch.Tensor, np.ndarray]) -> np.ndarray:
+        if isinstance(pixel_values, torch.Tensor):
+            pixel_values = pixel_values.numpy()
+        _, embeddings = self.client.request({"op": "embed"}, np.ascontiguousarray(pixel_values, dtype=np.float32))
+        return embeddings
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        _, embeddings = self.client.request({"op": "embed_text", "texts": list(texts)})
+        return embeddings
+
+
+class RemoteKeywordModel:
+    """Извлечение ключевых слов KeyBERT в процессе инференса, интерфейс совпадает с KeyBERT.extract_keywords."""
+
+    def __init__(self, socket_path: str, timeout: float = 60.0):
+        self.client = InferenceClient(socket_path, timeout=timeout)
+
+    def extract_keywords(self, docs: str, keyphrase_ngram_range: Tuple[int, int] = (1, 1),
+                         top_n: int = 5) -> List[Tuple[str, float]]:
+        response, _ = self.client.request({
+            "op": "keywords",
+            "text": docs,
+            "keyphrase_ngram_range": list(keyphrase_ngram_range),
+            "top_n": top_n,
+        })
+        return [(keyword, score) for keyword, score in response["keywords"]]
@@ -0,0 +1,59 @@
+import asyncio
+import json
+import socket
+import struct
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+__all__ = ['encode_frame', 'read_frame', 'recv_frame', 'Frame']
+
+# Кадр: длина JSON заголовка и длина полезной нагрузки (big-endian uint32), затем заголовок и сырые байты массива
+_PREFIX = struct.Struct(">II")
+
+Frame = Tuple[Dict[str, Any], Optional[np.ndarray]]
+
+
+def encode_frame(header: Dict[str, Any], array: Optional[np.ndarray] = None) -> bytes:
+    """Заголовок (JSON) и необязательный массив; dtype и shape массива передаются в заголовке."""
+    payload = b""
+    if array is not None:
+        array = np.ascontiguousarray(array)
+        header = {**header, "dtype": array.dtype.str, "shape": list(array.shape)}
+        payload = array.tobytes()
+    encoded = json.dumps(header).encode()
+    return _PREFIX.pack(len(encoded), len(payload)) + encoded + payload
+
+
+def _decode(header_bytes: bytes, payload: bytes) -> Frame:
+    header = json.loads(header_bytes)
+    if "dtype" not in header:
+        return header, None
+    array = np.frombuffer(payload, dtype=np.dtype(header.pop("dtype"))).reshape(header.pop("shape"))
+    return header, array
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Frame:
+    header_size, payload_size = _PREFIX.unpack(await reader.readexactly(_PREFIX.size))
+    header_bytes = await reader.readexactly(header_size)
+    payload = await reader.readexactly(payload_size) if payload_size else b""
+    return _decode(header_bytes, payload)
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        chunk = sock.recv_into(view[received:], size - received)
+        if chunk == 0:
+            raise ConnectionError("Inference server closed the connection")
+        received += chunk
+    return bytes(buffer)
+
+
+def recv_frame(sock: socket.socket) -> Frame:
+    header_size, payload_size = _PREFIX.unpack(_recv_exactly(sock, _PREFIX.size))
+    header_bytes = _recv_exactly(sock, header_size)
+    payload = _recv_exactly(sock, payload_size) if payload_size else b""
+    return _decode(header_bytes, payload)
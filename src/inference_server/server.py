@@ -0,0 +1,146 @@
+import argparse
+import asyncio
+import os
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from src.api.search.service import create_keyword_model
+from src.api.tags_model.backends import (load_clip_embedder,
+                                         load_clip_runner, load_vit_runner)
+from src.api.tags_model.executor import InferenceExecutor
+from src.api.tags_model.service import BatchScheduler
+from src.config import settings
+from src.inference_server.protocol import encode_frame, read_frame
+from src.logger import logger
+from src.utils.singleton_meta import SingletonMeta
+
+
+class InferenceServer(metaclass=SingletonMeta):
+    """Процесс инференса, владеющий единственной копией моделей на узле.
+
+    Воркеры API отправляют по unix сокету уже предобработанные тензоры и получают логиты.
+    Строки запросов всех соединений попадают в общие BatchScheduler, поэтому батч собирается
+    из запросов разных воркеров."""
+    batchers: Dict[str, BatchScheduler] = {}
+    runners: Dict[str, Callable[[np.ndarray], np.ndarray]] = {}
+    kw_model = None
+    clip_embedder = None
+    _connections: int = 0
+    _requests: int = 0
+
+    @classmethod
+    async def load(cls):
+        InferenceExecutor.start(
+            workers=settings.INFERENCE_EXECUTOR_WORKERS,
+            torch_threads=settings.INFERENCE_TORCH_THREADS
+        )
+        vit_runner, clip_runner, cls.clip_embedder, cls.kw_model = await asyncio.gather(
+            asyncio.to_thread(load_vit_runner, settings.VIT_MODEL_PATH, settings.VIT_BACKEND,
+                              settings.VIT_QUANTIZE, settings.INFERENCE_TORCH_THREADS),
+            asyncio.to_thread(load_clip_runner, settings.CLIP_MODEL_PATH, settings.CLIP_BACKEND,
+                              settings.CLIP_QUANTIZE, settings.INFERENCE_TORCH_THREADS),
+            asyncio.to_thread(load_clip_embedder, settings.CLIP_EMBEDDING_MODEL),
+            asyncio.to_thread(create_keyword_model, settings.KEYBERT_MODEL),
+        )
+        for name, runner in (("vit", vit_runner), ("clip", clip_runner)):
+            await InferenceExecutor.run(runner, np.zeros((1, 3, 224, 224), dtype=np.float32))
+            cls.runners[name] = runner
+            cls.batchers[name] = BatchScheduler(
+                name=name,
+                forward=runner,
+                max_batch_size=settings.INFERENCE_MAX_BATCH_SIZE,
+                max_wait_ms=settings.INFERENCE_MAX_WAIT_MS
+            )
+
+    @classmethod
+    async def forward(cls, model: str, pixel_values: np.ndarray) -> np.ndarray:
+        """Каждое изображение ставится в очередь отдельно и объединяется с запросами других воркеров."""
+        batcher = cls.batchers[model]
+        rows = await asyncio.gather(*(batcher.submit(pixel_values[i:i + 1]) for i in range(len(pixel_values))))
+        return np.stack(rows)
+
+    @classmethod
+    async def handle(cls, header: dict, array: Optional[np.ndarray]) -> bytes:
+        op = header.get("op")
+        if op == "forward":
+            return encode_frame({}, await cls.forward(header["model"], array))
+        if op == "embed":
+            return encode_frame({}, await InferenceExecutor.run(cls.clip_embedder.embed, array))
+        if op == "embed_text":
+            return encode_frame({}, await InferenceExecutor.run(cls.clip_embedder, header["texts"]))
+        if op == "keywords":
+            keywords = await InferenceExecutor.run(
+                cls.kw_model.extract_keywords, header["text"],
+                keyphrase_ngram_range=tuple(header["keyphrase_ngram_range"]), top_n=header["top_n"]
+            )
+            return encode_frame({"keywords": [[keyword, float(score)] for keyword, score in keywords]})
+        if op == "stats":
+            return encode_frame(cls.stats())
+        raise ValueError(f"Unknown operation: {op}")
+
+    @classmethod
+    async def serve_connection(cls, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        cls._connections += 1
+        try:
+            while True:
+                try:
+                    header, array = await read_frame(reader)
+                except asyncio.IncompleteReadError:
+                    break
+                cls._requests += 1
+                try:
+                    response = await cls.handle(header, array)
+                except Exception as e:
+                    logger.error(f"Inference server: {header.get('op')} failed", exc_info=True)
+                    response = encode_frame({"error": str(e)})
+                writer.write(response)
+                await writer.drain()
+        finally:
+            cls._connections -= 1
+            writer.close()
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {
+            "executor": InferenceExecutor.stats(),
+            "connections": cls._connections,
+            "requests": cls._requests,
+        }
+
+    @classmethod
+    async def close(cls):
+        for batcher in cls.batchers.values():
+            await batcher.close()
+        InferenceExecutor.shutdown()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Процесс инференса моделей тегов и KeyBERT для воркеров API")
+    parser.add_argument("--socket", default=settings.INFERENCE_SERVER_SOCKET or "/tmp/cii-inference.sock")
+    args = parser.parse_args()
+
+    await InferenceServer.load()
+
+    # Сокет создается только после загрузки моделей: клиенты до этого повторяют подключение
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+    server = await asyncio.start_unix_server(InferenceServer.serve_connection, path=args.socket)
+    logger.info("Inference server is listening", extra={"socket": args.socket})
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await InferenceServer.close()
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+"""
+Запуск программы:
+python -m src.inference_server.server --socket /tmp/cii-inference.sock
+INFERENCE_SERVER_SOCKET=/tmp/cii-inference.sock gunicorn src.main:app --workers 4 --worker-class uvicorn.workers.UvicornWorker
+"""
@@ -1,18 +1,55 @@
+import asyncio
+import os
+import signal
 import time
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Request, status
+from fastapi import FastAPI, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi_versioning import VersionedFastAPI
 
 from src.api import router_api
+from src.api.search.result_cache import SearchResultService
+from src.api.search.service import ElasticService
+from src.api.search.suggest import TagSuggestService
 from src.api.tags_model.service import TagsService
+from src.api.tags_model.zero_shot import ZeroShotService
 from src.config import settings
+from src.database.cii_db.queries import TransactionSessionQuery
 from src.logger import logger
 from src.utils import BaseAioHttpService
 from src.utils.elastic_service import BaseElasticService
 
 
+# Выставляется после загрузки и прогрева всех моделей, до этого /ready отвечает 503
+models_ready = asyncio.Event()
+
+
+async def load_models():
+    """Параллельная загрузка и прогрев моделей в фоне, сервер начинает принимать соединения сразу.
+
+    При ошибке загрузка повторяется MODELS_LOAD_RETRIES раз с паузой MODELS_LOAD_RETRY_DELAY_SECONDS;
+    если все попытки неудачны, процесс завершается, чтобы его перезапустил менеджер процессов
+    (иначе /ready отвечал бы 503 бесконечно)."""
+    start_time = time.perf_counter()
+    for attempt in range(1, settings.MODELS_LOAD_RETRIES + 2):
+        try:
+            await asyncio.gather(
+                TagsService.init_service(),
+                ElasticService.init_service(),
+            )
+            break
+        except Exception:
+            logger.exception("Models loading failed", extra={"attempt": attempt})
+            if attempt > settings.MODELS_LOAD_RETRIES:
+                logger.critical("Models could not be loaded, shutting down the worker")
+                os.kill(os.getpid(), signal.SIGTERM)
+                return
+            await asyncio.sleep(settings.MODELS_LOAD_RETRY_DELAY_SECONDS)
+    models_ready.set()
+    logger.info("Models are loaded", extra={"process_time": round(time.perf_counter() - start_time, 4)})
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # при запуске
@@ -23,16 +60,33 @@ async def lifespan(app: FastAPI):
     session_manager_aiohttp.set_session()
 
     connect_elastic = BaseElasticService()
-    connect_elastic.connect(
+    await connect_elastic.connect(
         host=settings.ELASTIC_URL,
-        verify_certs=False)
-    await TagsService.init_service()
+        verify_certs=False,
+        connections_per_node=settings.ELASTIC_CONNECTIONS_PER_NODE,
+        request_timeout=settings.ELASTIC_REQUEST_TIMEOUT,
+        max_retries=settings.ELASTIC_MAX_RETRIES,
+        retry_on_timeout=settings.ELASTIC_RETRY_ON_TIMEOUT)
+    await ElasticService.ensure_index(settings.ELASTIC_INDEX)
+    # Новые теги сразу доступны для разбора поисковых запросов
+    TransactionSessionQuery.add_new_tags_listener(ElasticService.add_vocabulary_tags)
+    TransactionSessionQuery.add_new_tags_listener(TagSuggestService.add_tags)
+    # Новое изображение сбрасывает кэш выдачи поиска
+    TransactionSessionQuery.add_new_picture_listener(SearchResultService.invalidate)
+    if settings.ZERO_SHOT_AUTO_UPDATE:
+        # Новые теги из парсера сразу получают эмбеддинги для zero-shot разметки
+        TransactionSessionQuery.add_new_tags_listener(ZeroShotService.add_tags)
+    loading_task = asyncio.create_task(load_models())
     try:
         yield
     finally:
         # При выключении
+        loading_task.cancel()
         await session_manager_aiohttp.close_session()
-        connect_elastic.close()
+        await TagsService.close_service()
+        ElasticService.close_service()
+        SearchResultService.close_service()
+        await connect_elastic.close()
         logger.critical("Server is down")
 
 
@@ -56,6 +110,15 @@ async def health():
     return "ok"
 
 
+@app.get("/ready", status_code=status.HTTP_200_OK)
+async def ready(response: Response):
+    """Готовность к приему трафика: модели загружены и прогреты."""
+    if not models_ready.is_set():
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return "loading"
+    return "ok"
+
+
 if settings.MODE == "PROD":
     origins = [
         "http://digiseller_orders_frontend:80",
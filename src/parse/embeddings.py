@@ -0,0 +1,63 @@
+import argparse
+import asyncio
+
+import numpy as np
+
+from src.api.search.embeddings import EmbeddingService
+from src.api.tags_model.executor import InferenceExecutor
+from src.api.tags_model.service import TagsService
+from src.database.cii_db.queries import PicturesQuery
+from src.utils.image_preprocessing import CLIP_PREPROCESSOR
+
+
+def preprocess(paths):
+    """Пачка изображений -> (pixel_values, индексы успешно открытых файлов)."""
+    rows, indices = [], []
+    for index, path in enumerate(paths):
+        try:
+            rows.append(CLIP_PREPROCESSOR.preprocess_one(path))
+            indices.append(index)
+        except Exception as e:
+            print(f"Не удалось открыть {path}: {e}")
+    return (np.concatenate(rows) if rows else None), indices
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Вычисление эмбеддингов CLIP для изображений без эмбеддинга")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--page-size", type=int, default=1000, help="Количество изображений за один запрос к базе")
+    args = parser.parse_args()
+
+    await TagsService.init_service()
+    await TagsService.init_clip_embedder()
+    store = EmbeddingService.get_store()
+
+    after_id, added = 0, 0
+    while True:
+        pictures = await PicturesQuery.get_pictures_paths(after_id=after_id, limit=args.page_size)
+        if not pictures:
+            break
+        after_id = pictures[-1]["id"]
+
+        # Повторный запуск досчитывает только новые изображения
+        missing = [picture for picture in pictures if picture["id"] not in store]
+        for start in range(0, len(missing), args.batch_size):
+            batch = missing[start:start + args.batch_size]
+            pixel_values, indices = await asyncio.to_thread(preprocess, [picture["path"] for picture in batch])
+            if pixel_values is None:
+                continue
+            embeddings = await InferenceExecutor.run(TagsService.clip_embedder.embed, pixel_values)
+            store.add([batch[index]["id"] for index in indices], embeddings)
+            added += len(indices)
+        print(f"Обработано изображений до id {after_id}, добавлено эмбеддингов: {added}")
+
+    await TagsService.close_service()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+"""
+Запуск программы:
+python -m src.parse.embeddings --batch-size 32
+"""
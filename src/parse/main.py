@@ -1,6 +1,8 @@
 import asyncio
 
 from src.api.search.service import ElasticService
+from src.api.tags_model.service import TagsService
+from src.api.tags_model.zero_shot import ZeroShotService
 from src.config import settings
 from src.database.cii_db.queries import TransactionSessionQuery
 from src.database.cii_db.schemas import PicturesCreateSchema
@@ -23,7 +25,7 @@ async def process_posts(post_id: int):
         image_info = await ParseService.get_image(soup=soup, name_file=name_file_img)
         tags_image = await ParseService.get_tags(soup=soup)
 
-        id_img = await TransactionSessionQuery.insert_new_picture(
+        id_img, tag_ids = await TransactionSessionQuery.insert_new_picture(
             info_picture=PicturesCreateSchema(
                 resolution_width=image_info.width,
                 resolution_height=image_info.height,
@@ -37,7 +39,8 @@ async def process_posts(post_id: int):
         await ElasticService.add_data(
             index_name=settings.ELASTIC_INDEX,
             id_image=id_img,
-            tags_image=tags_image
+            tags_image=tags_image,
+            tag_ids=tag_ids
         )
     except Exception as e:
         pass
@@ -53,9 +56,17 @@ async def bounded_process_posts(sem: asyncio.Semaphore, post_id: int):
 async def main():
     BaseAioHttpService.set_session()
     connect_elastic = BaseElasticService()
-    connect_elastic.connect(
+    await connect_elastic.connect(
         host=settings.ELASTIC_URL,
-        verify_certs=False)
+        verify_certs=False,
+        connections_per_node=settings.ELASTIC_CONNECTIONS_PER_NODE,
+        request_timeout=settings.ELASTIC_REQUEST_TIMEOUT,
+        max_retries=settings.ELASTIC_MAX_RETRIES,
+        retry_on_timeout=settings.ELASTIC_RETRY_ON_TIMEOUT)
+    await ElasticService.ensure_index(settings.ELASTIC_INDEX)
+    if settings.ZERO_SHOT_AUTO_UPDATE:
+        # Новые теги сразу получают эмбеддинги для zero-shot разметки, без отдельного запуска src.clip.tag_embeddings
+        TransactionSessionQuery.add_new_tags_listener(ZeroShotService.add_tags)
     max_value = 10_000_000
     min_value = 1
 
@@ -75,6 +86,8 @@ async def main():
     # await asyncio.gather(*tasks)
 
     await BaseAioHttpService.close_session()
+    await connect_elastic.close()
+    await TagsService.close_service()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,54 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from src.logger import logger
+
+__all__ = ['SharedLoad', 'BackoffRefresh']
+
+T = TypeVar("T")
+
+
+class SharedLoad:
+    """Однократная ленивая загрузка: параллельные вызовы ожидают одну и ту же задачу.
+
+    Задача защищена от отмены ожидающих (shield); после ошибки или отмены следующий вызов начинает
+    загрузку заново."""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Future] = None
+
+    async def run(self, load: Callable[[], Awaitable[T]]) -> T:
+        if self._task is None or (self._task.done() and (self._task.cancelled() or
+                                                         self._task.exception() is not None)):
+            self._task = asyncio.ensure_future(load())
+        return await asyncio.shield(self._task)
+
+
+class BackoffRefresh:
+    """Фоновое обновление устаревших данных не чаще раза в period секунд.
+
+    Время отмечается при запуске обновления, поэтому после ошибки следующая попытка выполняется через
+    period, а не на каждом запросе. Ошибка задачи логируется."""
+
+    def __init__(self, period: float, name: str):
+        self.period = period
+        self.name = name
+        self.updated_at = 0.0
+        self._task: Optional[asyncio.Future] = None
+
+    def touch(self):
+        """Данные только что загружены."""
+        self.updated_at = time.monotonic()
+
+    def schedule(self, refresh: Callable[[], Awaitable[None]]):
+        """Запускает refresh в фоне, если данные устарели и обновление еще не выполняется."""
+        if time.monotonic() - self.updated_at <= self.period or (self._task is not None and not self._task.done()):
+            return
+        self.touch()
+        self._task = asyncio.ensure_future(refresh())
+        self._task.add_done_callback(self._log_error)
+
+    def _log_error(self, task: asyncio.Future):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"{self.name} refresh failed", exc_info=task.exception())
@@ -1,42 +1,50 @@
-from elasticsearch import Elasticsearch
+from typing import Optional
+
+from elasticsearch import AsyncElasticsearch
 from elasticsearch.exceptions import ConnectionError, AuthenticationException
 from src.utils import SingletonMeta
 
 
 class BaseElasticService(metaclass=SingletonMeta):
-    _client: Elasticsearch = None
+    _client: Optional[AsyncElasticsearch] = None
 
     @classmethod
-    def connect(cls, host: str, username: str = None, password: str = None, verify_certs: bool = True):
-        """Устанавливает соединение с Elasticsearch."""
+    async def connect(cls, host: str, username: str = None, password: str = None, verify_certs: bool = True,
+                      connections_per_node: int = 10, request_timeout: float = 10.0, max_retries: int = 3,
+                      retry_on_timeout: bool = True):
+        """Устанавливает соединение с Elasticsearch.
+
+        Асинхронный клиент держит пул из connections_per_node соединений на узел, поэтому запросы
+        из разных корутин воркера выполняются параллельно и не блокируют цикл событий."""
         if cls._client is None:
             try:
-                if username and password:
-                    cls._client = Elasticsearch(
-                        [host],
-                        http_auth=(username, password),
-                        verify_certs=verify_certs
-                    )
-                else:
-                    cls._client = Elasticsearch([host], verify_certs=verify_certs)
+                cls._client = AsyncElasticsearch(
+                    [host],
+                    basic_auth=(username, password) if username and password else None,
+                    verify_certs=verify_certs,
+                    connections_per_node=connections_per_node,
+                    request_timeout=request_timeout,
+                    max_retries=max_retries,
+                    retry_on_timeout=retry_on_timeout
+                )
 
                 # Проверка соединения
-                if not cls._client.ping():
+                if not await cls._client.ping():
                     raise ConnectionError("Elasticsearch cluster is not reachable.")
 
             except (ConnectionError, AuthenticationException) as e:
                 print(f"Ошибка при подключении к Elasticsearch: {e}")
 
     @classmethod
-    def get_client(cls):
+    def get_client(cls) -> AsyncElasticsearch:
         """Возвращает текущего клиента Elasticsearch."""
         if cls._client is None:
             raise ConnectionError("Elasticsearch client is not initialized. Call 'connect' first.")
         return cls._client
 
     @classmethod
-    def close(cls):
-        """Закрывает соединение с Elasticsearch."""
+    async def close(cls):
+        """Закрывает соединения пула Elasticsearch."""
         if cls._client is not None:
-            cls._client.transport.close()
+            await cls._client.close()
             cls._client = None
@@ -0,0 +1,232 @@
+import fcntl
+import json
+import os
+import threading
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+__all__ = ['EmbeddingStore', 'IVFIndex', 'normalize_rows']
+
+# Размер блока строк для перевода float16 -> float32 при полном переборе
+_CHUNK_ROWS = 16384
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Индексы k наибольших значений по убыванию: argpartition + сортировка только k элементов."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    indices = np.argpartition(-scores, k - 1)[:k]
+    return indices[np.argsort(-scores[indices], kind="stable")]
+
+
+class IVFIndex:
+    """Приближенный поиск (inverted file): сферический k-means по строкам матрицы,
+    при запросе перебираются только строки nprobe ближайших кластеров."""
+
+    def __init__(self, n_lists: int, n_iter: int = 10, seed: int = 0):
+        self.n_lists = n_lists
+        self.n_iter = n_iter
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self.order: Optional[np.ndarray] = None
+        self.offsets: Optional[np.ndarray] = None
+        self.size = 0
+
+    def build(self, matrix: np.ndarray, sample_size: int = 65536) -> "IVFIndex":
+        rng = np.random.default_rng(self.seed)
+        size = matrix.shape[0]
+        sample = matrix[np.sort(rng.choice(size, min(size, sample_size), replace=False))].astype(np.float32)
+
+        centroids = sample[rng.choice(sample.shape[0], self.n_lists, replace=False)]
+        for _ in range(self.n_iter):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = np.bincount(assignment, minlength=self.n_lists) == 0
+            # Пустые кластеры получают случайные точки выборки
+            sums[empty] = sample[rng.choice(sample.shape[0], int(empty.sum()))]
+            centroids = normalize_rows(sums)
+
+        assignment = np.empty(size, dtype=np.int32)
+        for start in range(0, size, _CHUNK_ROWS):
+            chunk = matrix[start:start + _CHUNK_ROWS].astype(np.float32)
+            assignment[start:start + _CHUNK_ROWS] = np.argmax(chunk @ centroids.T, axis=1)
+
+        self.centroids = centroids
+        self.order = np.argsort(assignment, kind="stable")
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=self.n_lists))])
+        self.size = size
+        return self
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Номера строк из nprobe кластеров, ближайших к запросу."""
+        lists = _top_k(self.centroids @ query, nprobe)
+        return np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in lists])
+
+
+class EmbeddingStore:
+    """Хранилище нормализованных эмбеддингов изображений на диске, ключ - PicturesModel.id.
+
+    - embeddings.f16 - матрица (N, dim) float16, читается через np.memmap;
+    - ids.i64 - идентификаторы строк в том же порядке;
+    - meta.json - размерность и чекпоинт, которым вычислены эмбеддинги (model).
+    Файлы только дописываются (под flock, запись безопасна из нескольких процессов; хвост прерванной
+    записи обрезается перед следующей); при повторной записи id действует последняя строка.
+    Читатели подхватывают новые строки по размеру файлов.
+    Если задан model, хранилище другого чекпоинта не открывается: косинусная близость между эмбеддингами
+    разных моделей не имеет смысла."""
+
+    def __init__(self, path: str, ivf_min_size: int = 100_000, nprobe: int = 8, model: Optional[str] = None):
+        self.path = path
+        self.model = model
+        self.ivf_min_size = ivf_min_size
+        self.nprobe = nprobe
+        self.dim: Optional[int] = None
+
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        self._ids = np.empty(0, dtype=np.int64)
+        self._active = np.empty(0, dtype=bool)
+        self._rows: Dict[int, int] = {}
+        self._index: Optional[IVFIndex] = None
+        os.makedirs(path, exist_ok=True)
+        self.refresh()
+
+    @property
+    def _embeddings_path(self) -> str:
+        return os.path.join(self.path, "embeddings.f16")
+
+    @property
+    def _ids_path(self) -> str:
+        return os.path.join(self.path, "ids.i64")
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, "meta.json")
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, picture_id: int) -> bool:
+        self.refresh()
+        return int(picture_id) in self._rows
+
+    def refresh(self):
+        """Перечитывает файлы, если другой процесс дописал строки."""
+        if not os.path.exists(self._meta_path):
+            return
+        if self.dim is None:
+            with open(self._meta_path) as file:
+                meta = json.load(file)
+            if self.model is not None and meta.get("model") != self.model:
+                raise RuntimeError(f"Эмбеддинги в {self.path} вычислены моделью {meta.get('model')}, "
+                                   f"ожидается {self.model}: удалите каталог и вычислите их заново")
+            self.dim = meta["dim"]
+
+        row_bytes = self.dim * 2
+        count = min(os.path.getsize(self._ids_path) // 8, os.path.getsize(self._embeddings_path) // row_bytes)
+        if count == self._ids.shape[0]:
+            return
+
+        with self._lock:
+            ids = np.fromfile(self._ids_path, dtype=np.int64, count=count)
+            matrix = np.memmap(self._embeddings_path, dtype=np.float16, mode="r", shape=(count, self.dim))
+
+            # Для повторяющихся id активна только последняя строка
+            rows = {int(picture_id): row for row, picture_id in enumerate(ids.tolist())}
+            active = np.zeros(count, dtype=bool)
+            active[list(rows.values())] = True
+
+            self._matrix, self._ids, self._active, self._rows = matrix, ids, active, rows
+            # Индекс перестраивается, когда коллекция выросла более чем на 10% с момента построения
+            if count >= self.ivf_min_size and (self._index is None or count > self._index.size * 1.1):
+                self._index = IVFIndex(n_lists=int(np.sqrt(count))).build(matrix)
+
+    def add(self, ids: Sequence[int], embeddings: np.ndarray):
+        """Дописывает эмбеддинги (нормализуются и сохраняются в float16)."""
+        embeddings = normalize_rows(np.atleast_2d(embeddings)).astype(np.float16)
+        with open(os.path.join(self.path, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if self.dim is None:
+                self.dim = embeddings.shape[1]
+                with open(self._meta_path, "w") as file:
+                    json.dump({"dim": self.dim, "model": self.model}, file)
+            self._truncate_torn_rows()
+            # Сначала матрица, затем id: строка без id не видна читателям
+            with open(self._embeddings_path, "ab") as file:
+                file.write(embeddings.tobytes())
+            with open(self._ids_path, "ab") as file:
+                file.write(np.asarray(ids, dtype=np.int64).tobytes())
+        self.refresh()
+
+    def _truncate_torn_rows(self):
+        """Обрезает оба файла до числа полных строк: прерванная запись (например, упавший процесс
+        записал матрицу, но не id) иначе сдвинула бы соответствие строк и id для всех следующих строк.
+        Вызывается под flock."""
+        row_bytes = self.dim * 2
+        ids_size = os.path.getsize(self._ids_path) if os.path.exists(self._ids_path) else 0
+        embeddings_size = os.path.getsize(self._embeddings_path) if os.path.exists(self._embeddings_path) else 0
+        count = min(ids_size // 8, embeddings_size // row_bytes)
+        if ids_size != count * 8:
+            os.truncate(self._ids_path, count * 8)
+        if embeddings_size != count * row_bytes:
+            os.truncate(self._embeddings_path, count * row_bytes)
+
+    def get(self, picture_id: int) -> Optional[np.ndarray]:
+        self.refresh()
+        row = self._rows.get(int(picture_id))
+        return None if row is None else self._matrix[row].astype(np.float32)
+
+    def scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Косинусная близость нормализованного запроса со строками матрицы (все или указанные)."""
+        if rows is not None:
+            return self._matrix[rows].astype(np.float32) @ query
+        result = np.empty(self._matrix.shape[0], dtype=np.float32)
+        for start in range(0, self._matrix.shape[0], _CHUNK_ROWS):
+            result[start:start + _CHUNK_ROWS] = self._matrix[start:start + _CHUNK_ROWS].astype(np.float32) @ query
+        return result
+
+    def scores_for_ids(self, query: np.ndarray, ids: Sequence[int]) -> np.ndarray:
+        """Косинусная близость запроса с изображениями ids; для id без эмбеддинга - nan."""
+        self.refresh()
+        result = np.full(len(ids), np.nan, dtype=np.float32)
+        found = [(index, self._rows[int(picture_id)]) for index, picture_id in enumerate(ids)
+                 if int(picture_id) in self._rows]
+        if found:
+            indices, rows = map(np.asarray, zip(*found))
+            result[indices] = self.scores(normalize_rows(query).reshape(-1), rows)
+        return result
+
+    def search(self, query: np.ndarray, k: int, exclude: Sequence[int] = ()) -> Tuple[np.ndarray, np.ndarray]:
+        """k ближайших изображений: (id, косинусная близость) по убыванию близости.
+        Для больших коллекций кандидаты берутся из IVF индекса и строк, добавленных после его построения."""
+        self.refresh()
+        if self._matrix is None or not self._rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = normalize_rows(query).reshape(-1)
+
+        if self._index is not None:
+            rows = np.concatenate([
+                self._index.candidates(query, self.nprobe),
+                np.arange(self._index.size, self._matrix.shape[0]),
+            ])
+            scores = self.scores(query, rows)
+        else:
+            rows = np.arange(self._matrix.shape[0])
+            scores = self.scores(query)
+
+        mask = self._active[rows]
+        if exclude:
+            mask &= ~np.isin(self._ids[rows], np.asarray(exclude, dtype=np.int64))
+        rows, scores = rows[mask], scores[mask]
+
+        best = _top_k(scores, k)
+        return self._ids[rows[best]], scores[best]
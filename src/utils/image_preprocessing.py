@@ -0,0 +1,102 @@
+from io import BytesIO
+from typing import Sequence, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+__all__ = ['ImagePreprocessor', 'ImageSource', 'preprocess_shared', 'VIT_PREPROCESSOR', 'CLIP_PREPROCESSOR']
+
+ImageSource = Union[str, bytes, Image.Image]
+
+
+class ImagePreprocessor:
+    """Быстрая предобработка изображений для ViT/CLIP вместо HF процессоров.
+
+    - JPEG декодируется в draft режиме сразу в уменьшенном масштабе (DCT scaling), не ниже целевого размера;
+    - один resize (для center_crop - сразу из центрального квадрата) в uint8 буфер батча;
+    - нормализация (x / 255 - mean) / std выполняется одним умножением и сложением сразу в float32.
+    """
+
+    def __init__(self, size: int, mean: Sequence[float], std: Sequence[float], center_crop: bool = False,
+                 resample: int = Image.BILINEAR):
+        self.size = size
+        self.center_crop = center_crop
+        self.resample = resample
+        mean = np.asarray(mean, dtype=np.float32).reshape(1, 3, 1, 1)
+        std = np.asarray(std, dtype=np.float32).reshape(1, 3, 1, 1)
+        self._scale = (1.0 / (255.0 * std)).astype(np.float32)
+        self._bias = (-mean / std).astype(np.float32)
+
+    def load(self, source: ImageSource) -> Image.Image:
+        """Открывает изображение и декодирует его в RGB с уменьшением на этапе декодирования JPEG."""
+        if isinstance(source, Image.Image):
+            image = source
+        else:
+            image = Image.open(BytesIO(source) if isinstance(source, bytes) else source)
+
+        if image.format == "JPEG":
+            # draft выбирает наибольший коэффициент уменьшения, при котором обе стороны не меньше запрошенных
+            image.draft("RGB", (self.size, self.size))
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        return image
+
+    def resize_into(self, image: Image.Image, out: np.ndarray) -> None:
+        """Единственный resize изображения в out (size, size, 3) uint8."""
+        box = None
+        if self.center_crop:
+            width, height = image.size
+            side = min(width, height)
+            left, top = (width - side) / 2, (height - side) / 2
+            box = (left, top, left + side, top + side)
+        resized = image.resize((self.size, self.size), self.resample, box=box)
+        out[...] = np.asarray(resized, dtype=np.uint8)
+
+    def normalize(self, buffer: np.ndarray) -> np.ndarray:
+        """(N, H, W, 3) uint8 -> (N, 3, H, W) float32 с нормализацией за одно умножение и сложение."""
+        out = np.empty((buffer.shape[0], 3, self.size, self.size), dtype=np.float32)
+        np.multiply(buffer.transpose(0, 3, 1, 2), self._scale, out=out)
+        out += self._bias
+        return out
+
+    def to_buffer(self, sources: Sequence[ImageSource]) -> np.ndarray:
+        buffer = np.empty((len(sources), self.size, self.size, 3), dtype=np.uint8)
+        for index, source in enumerate(sources):
+            self.resize_into(self.load(source), buffer[index])
+        return buffer
+
+    def __call__(self, sources: Sequence[ImageSource]) -> np.ndarray:
+        """Пачка изображений (пути, байты или PIL) -> pixel_values (N, 3, size, size) float32."""
+        return self.normalize(self.to_buffer(sources))
+
+    def preprocess_one(self, source: ImageSource) -> np.ndarray:
+        return self([source])
+
+
+def preprocess_shared(source: ImageSource, *preprocessors: ImagePreprocessor) -> Tuple[np.ndarray, ...]:
+    """Одно декодирование для нескольких моделей; resize/crop и нормализация - у каждой модели свои,
+    поэтому результат совпадает с предобработкой каждой модели по отдельности.
+    JPEG уменьшается при декодировании не ниже наибольшего размера входа."""
+    image = max(preprocessors, key=lambda preprocessor: preprocessor.size).load(source)
+    result = []
+    for preprocessor in preprocessors:
+        buffer = np.empty((1, preprocessor.size, preprocessor.size, 3), dtype=np.uint8)
+        preprocessor.resize_into(image, buffer[0])
+        result.append(preprocessor.normalize(buffer))
+    return tuple(result)
+
+
+# Параметры соответствуют google/vit-base-patch16-224 (resize 224x224) и
+# openai/clip-vit-base-patch32 (resize по меньшей стороне + center crop 224, bicubic)
+VIT_PREPROCESSOR = ImagePreprocessor(
+    size=224,
+    mean=(0.5, 0.5, 0.5),
+    std=(0.5, 0.5, 0.5),
+)
+CLIP_PREPROCESSOR = ImagePreprocessor(
+    size=224,
+    mean=(0.48145466, 0.4578275, 0.40821073),
+    std=(0.26862954, 0.26130258, 0.27577711),
+    center_crop=True,
+    resample=Image.BICUBIC,
+)
@@ -0,0 +1,76 @@
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+import torch
+
+__all__ = ['export_onnx', 'quantize_onnx', 'check_parity', 'compare_latency']
+
+
+def export_onnx(module: torch.nn.Module, path: str, output_names: List[str], image_size: int = 224,
+                opset_version: int = 17) -> None:
+    """Экспорт модуля (pixel_values -> outputs) в ONNX с динамической размерностью батча."""
+    module.eval()
+    dummy = torch.randn(1, 3, image_size, image_size)
+    dynamic_axes = {"pixel_values": {0: "batch"}}
+    dynamic_axes.update({name: {0: "batch"} for name in output_names})
+
+    with torch.no_grad():
+        torch.onnx.export(
+            module,
+            (dummy,),
+            path,
+            input_names=["pixel_values"],
+            output_names=output_names,
+            dynamic_axes=dynamic_axes,
+            opset_version=opset_version,
+            do_constant_folding=True,
+        )
+
+
+def quantize_onnx(path: str, output: str) -> None:
+    """Динамическая int8 квантизация весов ONNX графа (MatMul/Gemm) для CPU инференса."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(path, output, weight_type=QuantType.QInt8)
+
+
+def check_parity(torch_fn: Callable[[torch.Tensor], np.ndarray], onnx_fn: Callable[[np.ndarray], np.ndarray],
+                 batch_size: int = 4, image_size: int = 224, atol: float = 1e-3) -> Dict[str, float]:
+    """Сравнивает логиты torch и onnxruntime на случайном батче.
+    Помимо максимального отклонения считает долю совпавших бинарных предсказаний (порог 0)."""
+    pixel_values = torch.randn(batch_size, 3, image_size, image_size)
+    with torch.no_grad():
+        expected = torch_fn(pixel_values)
+    actual = onnx_fn(pixel_values.numpy())
+
+    max_abs_diff = float(np.abs(expected - actual).max())
+    preds_agreement = float(((expected > 0) == (actual > 0)).mean())
+    result = {
+        "max_abs_diff": max_abs_diff,
+        "preds_agreement": preds_agreement,
+        "passed": max_abs_diff <= atol,
+    }
+    print(f"Parity: max |torch - onnx| = {max_abs_diff:.2e}, agreement = {preds_agreement:.4%}, "
+          f"{'OK' if result['passed'] else 'FAILED'} (atol={atol})")
+    return result
+
+
+def compare_latency(runners: Dict[str, Callable[[np.ndarray], np.ndarray]], batch_sizes: List[int] = (1, 8),
+                    image_size: int = 224, warmup: int = 3, repeats: int = 20) -> Dict[str, Dict[int, float]]:
+    """Средняя задержка forward (мс) для каждого раннера и размера батча."""
+    report = {name: {} for name in runners}
+    for batch_size in batch_sizes:
+        pixel_values = np.random.randn(batch_size, 3, image_size, image_size).astype(np.float32)
+        for name, runner in runners.items():
+            for _ in range(warmup):
+                runner(pixel_values)
+            start = time.perf_counter()
+            for _ in range(repeats):
+                runner(pixel_values)
+            report[name][batch_size] = (time.perf_counter() - start) / repeats * 1000
+
+    for batch_size in batch_sizes:
+        line = ", ".join(f"{name}: {report[name][batch_size]:.1f} ms" for name in runners)
+        print(f"Latency batch={batch_size}: {line}")
+    return report
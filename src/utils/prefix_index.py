@@ -0,0 +1,96 @@
+import heapq
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Tuple
+
+__all__ = ['PrefixIndex', 'normalize_tag']
+
+# Символ больше любого символа названий: граница диапазона ключей с заданным префиксом
+_MAX_CHAR = "\U0010ffff"
+
+
+def normalize_tag(name: str) -> str:
+    """Нижний регистр, подчеркивания и дефисы как пробелы: "Long_Hair" -> "long hair"."""
+    return " ".join(name.lower().replace("_", " ").replace("-", " ").split())
+
+
+class PrefixIndex:
+    """Подсказки тегов по префиксу: отсортированный массив ключей и двоичный поиск диапазона.
+
+    Ключи - название тега и каждый его хвост с начала слова ("long hair" находится и по "ha"),
+    результаты ранжируются по количеству изображений. Для коротких префиксов с большим диапазоном
+    ответы запоминаются до следующего изменения индекса."""
+
+    def __init__(self, tags: Iterable[Tuple[int, str, int]] = (), memo_min_range: int = 256,
+                 memo_size: int = 10_000):
+        self.memo_min_range = memo_min_range
+        self.memo_size = memo_size
+        self._ids: List[int] = []
+        self._names: List[str] = []
+        self._counts: List[int] = []
+        self._positions: Dict[int, int] = {}
+        self._keys: List[str] = []
+        self._key_tags: List[int] = []
+        self._memo: Dict[Tuple[str, int], List[Tuple[int, str, int]]] = {}
+
+        keys = []
+        for tag_id, name, count in tags:
+            keys.extend(self._append(tag_id, name, count))
+        keys.sort()
+        self._keys = [key for key, _ in keys]
+        self._key_tags = [position for _, position in keys]
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, tag_id: int) -> bool:
+        return tag_id in self._positions
+
+    def _append(self, tag_id: int, name: str, count: int) -> List[Tuple[str, int]]:
+        position = len(self._ids)
+        self._ids.append(tag_id)
+        self._names.append(name)
+        self._counts.append(count)
+        self._positions[tag_id] = position
+
+        words = normalize_tag(name).split(" ")
+        return [(" ".join(words[start:]), position) for start in range(len(words))]
+
+    def add(self, tag_id: int, name: str, count: int = 0):
+        """Новый тег: ключи вставляются в отсортированный массив без перестроения."""
+        if tag_id in self._positions:
+            return
+        for key, position in self._append(tag_id, name, count):
+            index = bisect_left(self._keys, key)
+            self._keys.insert(index, key)
+            self._key_tags.insert(index, position)
+        self._memo.clear()
+
+    def set_counts(self, counts: Dict[int, int]):
+        """Количество изображений по id тега (перестраивать массив ключей не нужно)."""
+        for tag_id, count in counts.items():
+            position = self._positions.get(tag_id)
+            if position is not None:
+                self._counts[position] = count
+        self._memo.clear()
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Tuple[int, str, int]]:
+        """До limit тегов (id, название, количество изображений) по убыванию количества изображений."""
+        prefix = normalize_tag(prefix)
+        if not prefix:
+            return []
+        result = self._memo.get((prefix, limit))
+        if result is not None:
+            return result
+
+        low = bisect_left(self._keys, prefix)
+        high = bisect_left(self._keys, prefix + _MAX_CHAR, low)
+        positions = set(self._key_tags[low:high])
+        best = heapq.nlargest(limit, positions, key=lambda position: (self._counts[position],
+                                                                      -len(self._names[position])))
+        result = [(self._ids[position], self._names[position], self._counts[position]) for position in best]
+
+        if high - low >= self.memo_min_range:
+            if len(self._memo) >= self.memo_size:
+                self._memo.clear()
+            self._memo[(prefix, limit)] = result
+        return result
@@ -0,0 +1,194 @@
+import asyncio
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+__all__ = ['TTLCache', 'SqliteCacheTier']
+
+_MISSING = object()
+
+
+class SqliteCacheTier:
+    """Дисковый уровень кэша на sqlite: переживает рестарты и может разделяться между воркерами."""
+
+    def __init__(self, path: str, ttl: float):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return _MISSING
+        value, expires_at = row
+        if expires_at < time.time():
+            self.delete(key)
+            return _MISSING
+        return pickle.loads(value)
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), time.time() + self.ttl)
+            )
+
+    def delete(self, key: str):
+        with self._lock:
+            self._connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM cache")
+
+    def purge_expired(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class TTLCache:
+    """Кэш в памяти процесса с вытеснением LRU и временем жизни записей.
+    При указании disk_path промахи памяти проверяются в дисковом уровне (sqlite);
+    из асинхронного кода используются aget/aget_many/aset, чтобы sqlite не блокировал event loop."""
+
+    def __init__(self, maxsize: int, ttl: float, disk_path: Optional[str] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = SqliteCacheTier(disk_path, ttl) if disk_path else None
+        if self._disk is not None:
+            self._disk.purge_expired()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self._get_memory(key)
+        if value is _MISSING and self._disk is not None:
+            value = self._get_disk(self._disk, key)
+        if value is _MISSING:
+            with self._lock:
+                self.misses += 1
+            return default
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self._set_memory(key, value)
+        if self._disk is not None:
+            self._disk.set(str(key), value)
+
+    async def aget(self, key: Hashable, default: Any = None) -> Any:
+        """get для event loop: дисковый уровень читается в отдельном потоке."""
+        return (await self.aget_many([key], default))[0]
+
+    async def aget_many(self, keys: List[Hashable], default: Any = None) -> List[Any]:
+        """Значения по списку ключей; промахи памяти читаются с диска одним вызовом в отдельном потоке."""
+        values = [self._get_memory(key) for key in keys]
+        missing = [index for index, value in enumerate(values) if value is _MISSING]
+        disk = self._disk
+        if missing and disk is not None:
+            found = await asyncio.to_thread(lambda: [self._get_disk(disk, keys[index]) for index in missing])
+            for index, value in zip(missing, found):
+                values[index] = value
+
+        result = []
+        for value in values:
+            if value is _MISSING:
+                with self._lock:
+                    self.misses += 1
+                value = default
+            result.append(value)
+        return result
+
+    async def aset(self, key: Hashable, value: Any):
+        """set для event loop: запись в дисковый уровень выполняется в отдельном потоке."""
+        self._set_memory(key, value)
+        disk = self._disk
+        if disk is not None:
+            await asyncio.to_thread(disk.set, str(key), value)
+
+    async def aset_many(self, items: Dict[Hashable, Any]):
+        """Запись нескольких значений; дисковый уровень пишется одним вызовом в отдельном потоке."""
+        for key, value in items.items():
+            self._set_memory(key, value)
+        disk = self._disk
+        if items and disk is not None:
+            await asyncio.to_thread(lambda: [disk.set(str(key), value) for key, value in items.items()])
+
+    def _get_memory(self, key: Hashable) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at >= now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+        return _MISSING
+
+    def _get_disk(self, disk: SqliteCacheTier, key: Hashable) -> Any:
+        value = disk.get(str(key))
+        if value is not _MISSING:
+            self._set_memory(key, value)
+            with self._lock:
+                self.disk_hits += 1
+        return value
+
+    def _set_memory(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+        if self._disk is not None:
+            self._disk.delete(str(key))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+    def close(self):
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.hits + self.disk_hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.disk_hits) / requests, 4) if requests else 0.0,
+        }
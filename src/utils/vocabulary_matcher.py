@@ -0,0 +1,118 @@
+import re
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Set, Tuple
+
+__all__ = ['VocabularyMatcher', 'tokenize']
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def _stem(token: str) -> str:
+    """Упрощенный стемминг английских окончаний множественного числа (cats -> cat, dresses -> dress)."""
+    if len(token) <= 3:
+        return token
+    if token.endswith("ies"):
+        return token[:-3] + "y"
+    if token.endswith(("sses", "shes", "ches", "xes")):
+        return token[:-2]
+    if token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Нижний регистр, подчеркивания и знаки препинания - разделители слов, стемминг каждого слова."""
+    return [_stem(token) for token in _TOKEN_RE.findall(text.lower())]
+
+
+class VocabularyMatcher:
+    """Поиск известных тегов в строке запроса автоматом Ахо-Корасик над словами.
+
+    Теги из нескольких слов (long_hair, "school uniform") совпадают только по границам слов. Новые теги
+    добавляются в бор сразу, суффиксные ссылки пересчитываются лениво при следующем поиске."""
+
+    def __init__(self, tags: Iterable[str] = ()):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Set[str]] = [set()]
+        self._depth: List[int] = [0]
+        self._tags: Set[str] = set()
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.add(tags)
+
+    def __len__(self) -> int:
+        return len(self._tags)
+
+    def add(self, tags: Iterable[str]):
+        with self._lock:
+            for tag in tags:
+                tokens = tokenize(tag)
+                if not tokens or tag in self._tags:
+                    continue
+                self._tags.add(tag)
+                node = 0
+                for token in tokens:
+                    next_node = self._goto[node].get(token)
+                    if next_node is None:
+                        next_node = len(self._goto)
+                        self._goto[node][token] = next_node
+                        self._goto.append({})
+                        self._fail.append(0)
+                        self._output.append(set())
+                        self._depth.append(self._depth[node] + 1)
+                    node = next_node
+                self._output[node].add(tag)
+                self._dirty = True
+
+    def _build_links(self):
+        """Суффиксные ссылки обходом в ширину; терминальные множества узлов не смешиваются,
+        совпадения по ссылкам собираются при поиске."""
+        queue = deque()
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for token, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and token not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(token, 0)
+                queue.append(child)
+        self._dirty = False
+
+    def find(self, text: str) -> List[Tuple[int, int, str]]:
+        """Все вхождения тегов: (первое слово, слово после последнего, тег)."""
+        with self._lock:
+            if self._dirty:
+                self._build_links()
+
+            matches = []
+            node = 0
+            for position, token in enumerate(tokenize(text)):
+                while node and token not in self._goto[node]:
+                    node = self._fail[node]
+                node = self._goto[node].get(token, 0)
+
+                state = node
+                while state:
+                    for tag in self._output[state]:
+                        matches.append((position + 1 - self._depth[state], position + 1, tag))
+                    state = self._fail[state]
+            return matches
+
+    def match(self, text: str) -> List[str]:
+        """Теги запроса без перекрытий: слева направо, при пересечении побеждает более длинный тег."""
+        matches = sorted(self.find(text), key=lambda item: (item[0], item[0] - item[1], item[2]))
+        result, covered_until = [], 0
+        for start, end, tag in matches:
+            if start < covered_until:
+                # Синонимичные написания одного и того же тега (long_hair и "long hair") возвращаются вместе
+                if result and (start, end) == result[-1][:2]:
+                    result.append((start, end, tag))
+                continue
+            result.append((start, end, tag))
+            covered_until = end
+        return [tag for _, _, tag in result]
@@ -2,17 +2,14 @@
 from typing import List
 
 import numpy as np
-from PIL import Image
+import torch
 from pydantic import BaseModel
 from sklearn.preprocessing import MultiLabelBinarizer
 from torch.utils.data import Dataset
-from transformers import ViTFeatureExtractor
 
 from src.database.cii_db.queries import TagsQuery
 from src.database.cii_db.queries.pictures import PicturesQuery
-
-# Используем ViTFeatureExtractor для подготовки изображений
-feature_extractor = ViTFeatureExtractor.from_pretrained('google/vit-base-patch16-224')
+from src.utils.image_preprocessing import VIT_PREPROCESSOR
 
 
 # Схема для хранения изображений с тегами
@@ -26,16 +23,8 @@ class PicturesWithTagsSchema(BaseModel):
 
 
 def process_image(image_path):
-    image = Image.open(image_path)
-
-    # Преобразуем изображение в RGB (ViT ожидает изображения в формате RGB)
-    image = image.convert("RGB")
-
-    # Изменение размера изображения до 224x224
-    image = image.resize((224, 224))
-
-    # Преобразование изображения с помощью feature_extractor
-    return feature_extractor(images=image, return_tensors="pt")
+    # Декодирование в RGB, resize до 224x224 и нормализация (та же предобработка, что и в API)
+    return torch.from_numpy(VIT_PREPROCESSOR.preprocess_one(image_path)[0])
 
 
 # Асинхронная функция для извлечения данных из базы данных
@@ -83,7 +72,7 @@ class ArtDataset(Dataset):
         tags = self.data[idx].tags
 
         # Преобразование изображения
-        image = process_image(image_path)['pixel_values'].squeeze(0)
+        image = process_image(image_path)
 
         # Преобразование тегов в бинарные метки (0 или 1 для каждого класса)
         encoded_tags = self.mlb.transform([tags])[0].astype(np.float32)
@@ -2,7 +2,8 @@
 import asyncio
 
 import torch
-from sklearn.metrics import accuracy_score, classification_report
+from sklearn.metrics import (accuracy_score, classification_report, f1_score,
+                             precision_score, recall_score)
 from torch.utils.data import DataLoader
 from transformers import ViTForImageClassification
 
@@ -30,6 +31,13 @@ async def evaluate_model(model, dataloader):
     print(f"Accuracy: {accuracy}")
     print(f"Classification Report:\n{report}")
 
+    return {
+        "accuracy": accuracy,
+        "precision": precision_score(true_labels, predictions, average='samples', zero_division=0),
+        "recall": recall_score(true_labels, predictions, average='samples', zero_division=0),
+        "f1": f1_score(true_labels, predictions, average='samples', zero_division=0),
+    }
+
 
 # Асинхронная основная функция для оценки модели
 async def main():
@@ -0,0 +1,55 @@
+# export_onnx.py
+import argparse
+
+import torch
+
+from src.api.tags_model.backends import OnnxRunner, TorchViTRunner
+from src.utils.onnx_export import check_parity, compare_latency, export_onnx, quantize_onnx
+from src.vit.save_model import load_model
+
+
+class ViTLogits(torch.nn.Module):
+    """Обертка ViT, возвращающая только логиты классификатора."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values):
+        return self.model(pixel_values=pixel_values).logits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Экспорт ViT классификатора тегов в ONNX")
+    parser.add_argument("--path", default="./vit-model", help="Каталог с обученной моделью")
+    parser.add_argument("--output", default=None, help="Путь к ONNX файлу (по умолчанию <path>/model.onnx)")
+    parser.add_argument("--quantize", action="store_true", help="Дополнительно сохранить int8 версию (model.int8.onnx)")
+    args = parser.parse_args()
+    output = args.output or f"{args.path}/model.onnx"
+
+    model = load_model(args.path).eval()
+    export_onnx(ViTLogits(model), output, output_names=["logits"])
+    print(f"ONNX граф сохранен: {output}")
+
+    torch_runner = TorchViTRunner(model)
+    onnx_runner = OnnxRunner(output)
+    check_parity(torch_runner, onnx_runner)
+    runners = {"torch": torch_runner, "onnxruntime": onnx_runner}
+
+    if args.quantize:
+        quantized_output = output.replace(".onnx", ".int8.onnx")
+        quantize_onnx(output, quantized_output)
+        print(f"int8 ONNX граф сохранен: {quantized_output}")
+        runners["onnxruntime int8"] = OnnxRunner(quantized_output)
+
+    compare_latency(runners)
+
+
+if __name__ == "__main__":
+    main()
+
+"""
+Запуск программы:
+python -m src.vit.export_onnx
+python -m src.vit.export_onnx --quantize
+"""
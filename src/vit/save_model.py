@@ -10,17 +10,19 @@ __all__ = ['save_model', 'load_model', 'load_classes']
 
 # Сохранение модели
 def save_model(model, tags: List[str], path='./vit-model'):
-    model.save_pretrained(path)
+    # Веса в safetensors (model.safetensors) читаются через mmap без промежуточной копии state dict
+    model.save_pretrained(path, safe_serialization=True)
     # Сохранение параметра num_labels в JSON-файл
     config_data = {"tags": tags}
     with open(f"{path}/classes.json", "w") as json_file:
         json.dump(config_data, json_file)
 
 
-# Загрузка модели
+# Загрузка модели: модель создается по сохраненному конфигу без инициализации весов,
+# веса отображаются из model.safetensors (старый pytorch_model.bin тоже поддерживается)
 @lru_cache(maxsize=1)
 def load_model(path='./vit-model'):
-    return ViTForImageClassification.from_pretrained(path)
+    return ViTForImageClassification.from_pretrained(path, local_files_only=True, low_cpu_mem_usage=True)
 
 
 def load_classes(path='./vit-model') -> List[str]:
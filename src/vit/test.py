@@ -42,7 +42,7 @@ async def evaluate_model(model, test_dataloader):
 
 # Прогнозирование на новых изображениях
 def predict_on_new_image(model, image_path, mlb):
-    image = process_image(image_path)['pixel_values'].squeeze(0).unsqueeze(0)  # Преобразуем изображение
+    image = process_image(image_path).unsqueeze(0)  # Преобразуем изображение
     model.eval()
     with torch.no_grad():
         output = model(image)
@@ -0,0 +1,27 @@
+import numpy as np
+
+from src.api.tags_model.decoding import TagDecoder
+
+
+def _logits_for(probs):
+    probs = np.asarray(probs, dtype=np.float64)
+    return np.log(probs / (1.0 - probs)).astype(np.float32)
+
+
+def test_threshold_boundary_is_same_with_and_without_top_k():
+    decoder = TagDecoder(["a", "b", "c"])
+    logits = _logits_for([0.9, 0.3, 0.1])
+    # Порог ровно на вероятности тега: одинаковое включение в обеих ветках
+    threshold = float(TagDecoder.probabilities(logits)[1])
+
+    without_top_k = [tag for tag, _ in decoder.decode(logits, threshold=threshold)]
+    with_top_k = [tag for tag, _ in decoder.decode(logits, top_k=3, threshold=threshold)]
+
+    assert without_top_k == with_top_k == ["a", "b"]
+
+
+def test_default_threshold_keeps_small_positive_logits():
+    decoder = TagDecoder(["a", "b"])
+    logits = np.array([1e-8, -1e-8], dtype=np.float32)
+
+    assert [tag for tag, _ in decoder.decode(logits)] == ["a"]
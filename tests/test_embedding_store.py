@@ -0,0 +1,13 @@
+import numpy as np
+import pytest
+
+from src.utils.embedding_store import EmbeddingStore
+
+
+def test_store_of_another_model_is_rejected(tmp_path):
+    store = EmbeddingStore(str(tmp_path), model="base")
+    store.add([1, 2], np.eye(2, 4, dtype=np.float32))
+
+    assert len(EmbeddingStore(str(tmp_path), model="base")) == 2
+    with pytest.raises(RuntimeError):
+        EmbeddingStore(str(tmp_path), model="fine-tuned")